@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark fixture materialization across layouts and modes.
+
+Every layout of :py:data:`pytest_ngsfixtures.config.layout`, the
+reference layout and synthetic layouts of the given sizes are setup
+with :py:class:`~pytest_ngsfixtures.plugin.Fixture` in every mode, and
+with the per-file functions safe_copy and safe_symlink. Results are
+written as JSON. If a baseline is given, cases whose best time exceeds
+the baseline by more than the threshold are reported as regressions
+and the exit status is 1.
+
+Usage:
+
+   python benchmarks/bench_fixtures.py [-o results.json] [--repeat N]
+       [--sizes 1000 10000 100000] [--modes copy symlink ...]
+       [--baseline baseline.json] [--threshold 0.2]
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import py
+import pytest_ngsfixtures
+from pytest_ngsfixtures.config import layout, reflayout
+from pytest_ngsfixtures.os import MODES, FixtureRoot, safe_copy, safe_symlink
+from pytest_ngsfixtures.plugin import Fixture
+from synthetic import synthetic_layout
+
+# Per-file functions by mode
+SAFE_FUNCTIONS = {
+    'copy': safe_copy,
+    'symlink': safe_symlink,
+}
+
+
+def layouts(sizes):
+    """Benchmark layouts by name"""
+    data = {"layout/{}".format(k): v for k, v in layout.items()}
+    data["reflayout"] = reflayout
+    for n in sizes:
+        data["synthetic/{}".format(n)] = synthetic_layout(n)
+    return data
+
+
+def fixture_setup(p, data, mode, factory):
+    Fixture(path=p, data=data, mode=mode, tmpdir_factory=factory)
+
+
+def safe_setup(p, data, mode, factory):
+    func = SAFE_FUNCTIONS[mode]
+    for dst, src in data.items():
+        func(p, src, dst)
+
+
+def bench(root, setup, data, mode, repeat, factory):
+    """Time setup of data in mode repeat times in fresh directories"""
+    times = []
+    for _ in range(repeat):
+        p = py.path.local(tempfile.mkdtemp(prefix="bench_fixtures", dir=str(root)))
+        t = time.perf_counter()
+        setup(p, data, mode, factory)
+        times.append(time.perf_counter() - t)
+        shutil.rmtree(str(p))
+    return times
+
+
+def run(args):
+    root = py.path.local(tempfile.mkdtemp(prefix="bench_fixtures", dir=args.tmpdir))
+    # Fixtures locate the store of mode store through this factory
+    factory = FixtureRoot(root.join("store"))
+    results = []
+    try:
+        for name, data in layouts(args.sizes).items():
+            for mode in args.modes:
+                cases = [("fixture", fixture_setup)]
+                if mode in SAFE_FUNCTIONS:
+                    cases.append(("safe", safe_setup))
+                for api, setup in cases:
+                    times = bench(root, setup, data, mode, args.repeat, factory)
+                    results.append({
+                        'name': "{}:{}:{}".format(name, mode, api),
+                        'layout': name,
+                        'mode': mode,
+                        'api': api,
+                        'files': len(data),
+                        'repeat': args.repeat,
+                        'min': min(times),
+                        'median': statistics.median(times),
+                    })
+                    print("{:<40}{:>8}{:>12.2f}{:>12.2f}".format(
+                        results[-1]['name'], len(data), 1000 * min(times),
+                        1000 * statistics.median(times)), file=sys.stderr)
+    finally:
+        shutil.rmtree(str(root))
+    return {
+        'meta': {
+            'version': pytest_ngsfixtures.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'tmpdir': args.tmpdir or tempfile.gettempdir(),
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compare results to a baseline.
+
+    Returns:
+      list: (name, baseline time, time, relative change) of cases
+      whose best time exceeds the baseline by more than threshold
+    """
+    base = {x['name']: x for x in baseline['results']}
+    regressions = []
+    for x in results['results']:
+        if x['name'] not in base:
+            continue
+        change = x['min'] / base[x['name']]['min'] - 1
+        if change > threshold:
+            regressions.append((x['name'], base[x['name']]['min'], x['min'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="number of files in synthetic layouts")
+    parser.add_argument("--modes", nargs="*", default=MODES, choices=MODES)
+    parser.add_argument("--tmpdir", help="directory in which fixtures are setup")
+    parser.add_argument("--baseline", help="baseline results to compare to")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default: 0.2)")
+    args = parser.parse_args()
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as fh:
+        regressions = compare(results, json.load(fh), args.threshold)
+    for name, base, t, change in regressions:
+        print("REGRESSION {}: {:.2f} ms -> {:.2f} ms (+{:.0%})".format(
+            name, 1000 * base, 1000 * t, change), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
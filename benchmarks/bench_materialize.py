@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark the planned fast-path materializer against the per-file
+path.
+
+Usage:
+
+   python benchmarks/bench_materialize.py [--repeat N] [--files N]
+"""
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import py
+from pytest_ngsfixtures.config import layout
+from pytest_ngsfixtures.os import materialize_data, STORE_MODES
+from pytest_ngsfixtures.store import FixtureStore
+from synthetic import synthetic_layout
+
+
+def bench(data, mode, fast, repeat):
+    times = []
+    for _ in range(repeat):
+        p = py.path.local(tempfile.mkdtemp(prefix="bench_materialize"))
+        store = FixtureStore(p.join(".store")) if mode in STORE_MODES else None
+        t = time.perf_counter()
+        materialize_data(p.join("data"), data, mode=mode, fast=fast, store=store)
+        times.append(time.perf_counter() - t)
+        shutil.rmtree(str(p))
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--files", type=int, default=1000)
+    args = parser.parse_args()
+    layouts = dict(layout)
+    layouts["synthetic{}".format(args.files)] = synthetic_layout(args.files)
+    print("{:<28}{:<10}{:>12}{:>12}{:>9}".format("layout", "mode", "path (ms)", "fast (ms)", "speedup"))
+    for name, data in layouts.items():
+        for mode in ["copy", "symlink", "hardlink"]:
+            slow = bench(data, mode, False, args.repeat)
+            fast = bench(data, mode, True, args.repeat)
+            print("{:<28}{:<10}{:>12.2f}{:>12.2f}{:>8.1f}x".format(
+                name, mode, 1000 * slow, 1000 * fast, slow / fast))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Synthetic layouts shared by the benchmarks."""
+from pytest_ngsfixtures.config import SAMPLES_DIR
+
+
+def synthetic_layout(n):
+    """Nested layout of n files distributed over populations, samples
+    and runs"""
+    src = str(SAMPLES_DIR / "CHS.HG00512_1.fastq.gz")
+    return {"pop{}/sample{}/run{}/s{}_1.fastq.gz".format(i % 3, i % 100, i % 7, i): src
+            for i in range(n)}
@@ -1,12 +1,28 @@
 # -*- coding: utf-8 -*-
+import sys
 import pathlib
-from ._version import get_versions
 
 __author__ = """Per Unneberg"""
 __email__ = 'per.unneberg@scilifelab.se'
-__version__ = get_versions()['version']
-del get_versions
 
 # Package root and data directory paths
 ROOT_DIR = pathlib.Path(__file__).parent
 DATA_DIR = ROOT_DIR / "data"
+
+
+def _version():
+    from ._version import get_versions
+    return get_versions()['version']
+
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # The version is looked up on first access since versioneer
+        # may call git, which would slow down the import of the plugin
+        if name == "__version__":
+            globals()["__version__"] = _version()
+            return globals()["__version__"]
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+else:
+    # Module __getattr__ (PEP 562) requires Python 3.7
+    __version__ = _version()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Block-parallel BGZF and multi-member gzip writer.
+
+Data is split in blocks that are compressed independently in a thread
+pool (zlib releases the GIL while compressing) and written in order.
+Each block is a complete gzip member, so the output is readable by
+standard gzip readers, which decompress concatenated members as one
+stream.
+
+In BGZF mode, blocks hold at most :py:data:`BLOCK_SIZE` bytes of
+input, members carry the BC extra field with the compressed block size
+and the file ends with the BGZF end-of-file marker
+:py:data:`EOF_MARKER`, as required by htslib readers. In plain gzip
+mode, blocks are larger and members have a plain gzip header.
+
+Since concatenated gzip members are valid gzip, gzip files can be
+pooled without recompression with :py:func:`concatenate`.
+
+Examples:
+
+   .. code-block:: python
+
+      with BgzfWriter("reads.fastq.gz", threads=4) as fh:
+          fh.write(data)
+"""
+import os
+import zlib
+import errno
+import struct
+import logging
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of input bytes per BGZF block; guarantees that a
+# compressed block, including header and footer, fits in 64 KiB
+BLOCK_SIZE = 0xff00
+
+# Input bytes per member in plain gzip mode
+GZIP_BLOCK_SIZE = 1024 * 1024
+
+# Empty BGZF block marking the end of a BGZF file
+EOF_MARKER = (b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43"
+              b"\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+
+_BUFSIZE = 1024 * 1024
+
+_UNSUPPORTED = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP)
+
+# gzip header: magic, deflate, flags, mtime 0, extra flags, OS unknown
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+# BGZF header up to the BSIZE field: as above with FEXTRA set, XLEN 6
+# and subfield BC of length 2
+_BGZF_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00"
+
+
+def _deflate(data, level):
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush()
+
+
+def compress_block(data, level=6, bgzf=True):
+    """Compress data as a single gzip member.
+
+    Args:
+      data (bytes): uncompressed data; at most :py:data:`BLOCK_SIZE`
+                    bytes in BGZF mode
+      level (int): compression level
+      bgzf (bool): write a BGZF block
+
+    Returns:
+      bytes: gzip member
+    """
+    deflated = _deflate(data, level)
+    footer = struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+    if not bgzf:
+        return _GZIP_HEADER + deflated + footer
+    if len(data) > BLOCK_SIZE:
+        raise ValueError("BGZF block holds at most {} bytes; got {}".format(BLOCK_SIZE, len(data)))
+    bsize = len(_BGZF_HEADER) + 2 + len(deflated) + len(footer)
+    if bsize > 0x10000:
+        # Incompressible data; store instead
+        deflated = _deflate(data, 0)
+        bsize = len(_BGZF_HEADER) + 2 + len(deflated) + len(footer)
+    return _BGZF_HEADER + struct.pack("<H", bsize - 1) + deflated + footer
+
+
+class BgzfWriter:
+    """Write BGZF or multi-member gzip files with a thread pool.
+
+    Args:
+      filename (str): output file name
+      threads (int): number of compression threads; defaults to the
+                     number of CPUs
+      level (int): compression level
+      bgzf (bool): write BGZF; plain multi-member gzip if False
+      blocksize (int): input bytes per block; defaults to
+                       :py:data:`BLOCK_SIZE` in BGZF mode and
+                       :py:data:`GZIP_BLOCK_SIZE` otherwise
+    """
+    def __init__(self, filename, threads=None, level=6, bgzf=True, blocksize=None):
+        self.filename = str(filename)
+        self.level = level
+        self.bgzf = bgzf
+        self.blocksize = blocksize or (BLOCK_SIZE if bgzf else GZIP_BLOCK_SIZE)
+        if bgzf and self.blocksize > BLOCK_SIZE:
+            raise ValueError("BGZF block size must be at most {}".format(BLOCK_SIZE))
+        self.threads = max(1, threads or os.cpu_count() or 1)
+        self._fh = open(self.filename, "wb")
+        self._buffer = bytearray()
+        self._pending = collections.deque()
+        self._executor = None
+        if self.threads > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.closed = False
+
+    def __repr__(self):
+        return "BgzfWriter('{}', threads={}, bgzf={})".format(self.filename, self.threads, self.bgzf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _submit(self, data):
+        if self._executor is None:
+            self._fh.write(compress_block(data, self.level, self.bgzf))
+            return
+        self._pending.append(self._executor.submit(compress_block, data, self.level, self.bgzf))
+        # Bound the number of blocks in flight, writing in order
+        while len(self._pending) > 2 * self.threads:
+            self._fh.write(self._pending.popleft().result())
+
+    def write(self, data):
+        """Write data.
+
+        Args:
+          data (bytes): uncompressed data
+
+        Returns:
+          int: number of bytes written
+        """
+        if self.closed:
+            raise ValueError("write to closed file {}".format(self.filename))
+        self._buffer += data
+        n = len(self._buffer) // self.blocksize * self.blocksize
+        if n:
+            view = memoryview(self._buffer)
+            for i in range(0, n, self.blocksize):
+                self._submit(bytes(view[i:i + self.blocksize]))
+            view.release()
+            del self._buffer[:n]
+        return len(data)
+
+    def flush(self):
+        """Compress and write buffered data, ending the current block"""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._fh.write(self._pending.popleft().result())
+        self._fh.flush()
+
+    def close(self):
+        """Flush data, write the BGZF end-of-file marker and close the file"""
+        if self.closed:
+            return
+        try:
+            self.flush()
+            if self.bgzf:
+                self._fh.write(EOF_MARKER)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._fh.close()
+            self.closed = True
+
+
+def compress_file(src, dst, threads=None, level=6, bgzf=True):
+    """Compress files, or recompress gzip files, to a single file.
+
+    Args:
+      src (str, list): input file name, or list of input file names
+                       that are concatenated; gzip input is decompressed
+      dst (str): output file name
+      threads (int): number of compression threads
+      level (int): compression level
+      bgzf (bool): write BGZF; plain multi-member gzip if False
+    """
+    import gzip
+    src = [src] if isinstance(src, str) or not hasattr(src, "__iter__") else list(src)
+    with BgzfWriter(dst, threads=threads, level=level, bgzf=bgzf) as out:
+        for path in src:
+            with open(str(path), "rb") as fh:
+                gzipped = fh.read(2) == b"\x1f\x8b"
+            opener = gzip.open if gzipped else open
+            with opener(str(path), "rb") as fh:
+                for chunk in iter(lambda: fh.read(4 * GZIP_BLOCK_SIZE), b""):
+                    out.write(chunk)
+
+
+def is_bgzf(path):
+    """Check whether a file is BGZF compressed.
+
+    Args:
+      path (str): file name
+
+    Returns:
+      bool: True if the first gzip member is a BGZF block
+    """
+    with open(str(path), "rb") as fh:
+        header = fh.read(18)
+    return len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04" and header[12:16] == b"BC\x02\x00"
+
+
+def _has_eof(fd, size):
+    if size < len(EOF_MARKER):
+        return False
+    return os.pread(fd, len(EOF_MARKER), size - len(EOF_MARKER)) == EOF_MARKER
+
+
+def _copy_range(sfd, dfd, count):
+    """Copy count bytes from the offset of sfd to the offset of dfd"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            while count > 0:
+                n = os.copy_file_range(sfd, dfd, count)
+                if n == 0:
+                    return
+                count -= n
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+    while count > 0:
+        buf = memoryview(os.read(sfd, min(count, _BUFSIZE)))
+        if not buf:
+            return
+        count -= len(buf)
+        while buf:
+            buf = buf[os.write(dfd, buf):]
+
+
+def concatenate(inputs, output):
+    """Concatenate gzip files without recompression.
+
+    The members of the input files are copied byte for byte, in
+    kernel space where supported. BGZF end-of-file markers of the
+    inputs are dropped, and the output ends with one if all inputs
+    are BGZF, so that pooled BGZF files remain valid BGZF.
+
+    Args:
+      inputs (list): gzip file names
+      output (str): output file name
+
+    Returns:
+      bool: True if the output is BGZF
+    """
+    inputs = [str(x) for x in inputs]
+    bgzf = len(inputs) > 0
+    for path in inputs:
+        with open(path, "rb") as fh:
+            if fh.read(2) != b"\x1f\x8b":
+                raise ValueError("{} is not gzip compressed".format(path))
+        bgzf = bgzf and is_bgzf(path)
+    fd = os.open(str(output), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for path in inputs:
+            sfd = os.open(path, os.O_RDONLY)
+            try:
+                size = os.fstat(sfd).st_size
+                if _has_eof(sfd, size):
+                    size -= len(EOF_MARKER)
+                _copy_range(sfd, fd, size)
+            finally:
+                os.close(sfd)
+        if bgzf:
+            os.write(fd, EOF_MARKER)
+    finally:
+        os.close(fd)
+    return bgzf
@@ -1,23 +1,137 @@
 # -*- coding: utf-8 -*-
-"""Configuration settings for pytest-ngsfixtures"""
+"""Configuration settings for pytest-ngsfixtures
+
+The module is imported by the plugin in every pytest process, so
+nothing is computed at import time: the sample layouts are built on
+first access through the :py:data:`layout` registry, and the
+reference layout :py:data:`reflayout` is listed from the data
+directory on first access to its items.
+"""
 import os
 import pathlib
 import logging
+import functools
+import threading
+from collections.abc import Mapping
 from pytest_ngsfixtures import DATA_DIR
+from pytest_ngsfixtures.sampletable import SampleTable
+from pytest_ngsfixtures.template import layout_from_template
 
 REF_DIR = DATA_DIR / "ref"
 SAMPLES_DIR = DATA_DIR / "seq"
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 refignore = ["Makefile"]
-reflayout = {x.name:str(x) for x in REF_DIR.iterdir() if x.name not in refignore}
 
-# Define sampleinfo
-# TODO: Simplify this definition
+
+class RefLayout(Mapping):
+    """Reference layout, a key value mapping of file names and paths
+    in the reference directory.
+
+    The reference directory is listed on first access and the listing
+    is cached. Compressed references (see
+    :py:mod:`pytest_ngsfixtures.refcache`) are listed by their
+    decompressed name and decompressed to the user cache at this
+    point.
+    """
+    def __init__(self):
+        self._layout = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._layout is None:
+                from pytest_ngsfixtures.refcache import REFERENCES, reference
+                compressed = [x for x, _ in REFERENCES.values() if x not in REFERENCES]
+                layout = {x.name: str(x) for x in REF_DIR.iterdir() if x.name not in refignore + compressed}
+                layout.update({x: reference(x) for x in REFERENCES})
+                self._layout = layout
+            return self._layout
+
+    def __getitem__(self, name):
+        return self._get()[name]
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __repr__(self):
+        return "RefLayout({})".format(self._get())
+
+
+# Reference layout
+reflayout = RefLayout()
+
+
+# Reference bundles, defined by file name suffixes
+refbundles = {
+    'fasta': ['.fa', '.fasta'],
+    'annotation': ['.gtf', '.bed12', '.genePred', '.refFlat'],
+    'variants': ['.vcf.gz'],
+    'intervals': ['.bed', '.interval_list', '.chrom.sizes'],
+    'genbank': ['.gb'],
+}
+
+# Sidecar files required by reference files; the file name suffix is
+# replaced by the sidecar suffix
+refsidecars = {
+    '.fa': ['.fa.fai', '.dict'],
+    '.fasta': ['.fasta.fai', '.dict'],
+    '.vcf.gz': ['.vcf.gz.tbi'],
+}
+
+
+def refselect(bundles, layout=None):
+    """Select reference files by bundle.
+
+    Sidecar files (see :py:data:`refsidecars`), such as fasta indices
+    and sequence dictionaries, of the selected files are added
+    automatically if present in the layout.
+
+    Examples:
+
+       .. code-block:: python
+
+          refselect(["fasta", "variants"])
+          refselect(["scaffolds.fa"])
+
+    Args:
+      bundles (list): bundle names (see :py:data:`refbundles`) or file
+                      names in the layout
+      layout (dict): reference layout to select from; defaults to
+                     :py:data:`reflayout`
+
+    Returns:
+      dict: the selected subset of the layout
+    """
+    if layout is None:
+        layout = reflayout
+    if isinstance(bundles, str):
+        bundles = [bundles]
+    suffixes = []
+    names = set()
+    for b in bundles:
+        if b in refbundles:
+            suffixes.extend(refbundles[b])
+        elif b in layout:
+            names.add(b)
+        else:
+            raise ValueError("no such reference bundle or file: '{}'; bundles are {}".format(b, ", ".join(sorted(refbundles))))
+    selected = {k for k in layout if k in names or k.endswith(tuple(suffixes))}
+    for k in list(selected):
+        for suffix, sidecars in refsidecars.items():
+            if k.endswith(suffix):
+                stem = k[:-len(suffix)]
+                selected.update(x for x in (stem + y for y in sidecars) if x in layout)
+    return {k: v for k, v in layout.items() if k in selected}
+
+
+# Sample table of the bundled sequence files
 # Columns are sample, pu, pop, batch, fastq, read, run, is_pool
-sampleinfo = [
+sampleinfo = SampleTable([
     ['CHS.HG00512', '010101_AAABBB11XX', 'CHS', 'p1', 'CHS.HG00512_1.fastq.gz', '1', 'CHS.HG00512', False],
     ['CHS.HG00512', '010101_AAABBB11XX', 'CHS', 'p1', 'CHS.HG00512_2.fastq.gz', '2', 'CHS.HG00512', False],
     ['CHS.HG00513', '010101_AAABBB11XX', 'CHS', 'p1', 'CHS.HG00513_1.fastq.gz', '1', 'CHS.HG00513', False],
@@ -44,35 +158,72 @@ sampleinfo = [
     ['YRI.NA19239', '010101_AAABBB11XX', 'YRI', 'p1', 'YRI.NA19239_2.fastq.gz', '2', 'YRI.NA19239', False],
     ['YRI', '010101_AAABBB11XX', 'YRI', 'p1', 'YRI_1.fastq.gz', '1', 'YRI', True],
     ['YRI', '010101_AAABBB11XX', 'YRI', 'p1', 'YRI_2.fastq.gz', '2', 'YRI', True]
-]
+])
+
+
+class Layouts(Mapping):
+    """Registry of sample layouts.
+
+    Layouts are registered as functions that build the layout, a
+    key value mapping of destination and source files. A layout is
+    built on first access and cached.
+
+    Examples:
+
+       .. code-block:: python
+
+          layout.register("single", lambda: {'s1.fastq.gz': str(SAMPLES_DIR / 'CHS.HG00512_1.fastq.gz')})
+          layout.register("pur", functools.partial(layout_from_template, "{SM}/{SM}_{read}.fastq.gz", pop="PUR"))
+          print(layout['single'])
+    """
+    def __init__(self):
+        self._builders = {}
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, builder):
+        """Register a layout.
+
+        Args:
+          name (str): layout name
+          builder (callable): function without arguments returning the layout
+        """
+        with self._lock:
+            self._builders[name] = builder
+            self._cache.pop(name, None)
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = self._builders[name]()
+            return self._cache[name]
+
+    def __iter__(self):
+        return iter(list(self._builders))
+
+    def __len__(self):
+        return len(self._builders)
+
+    def __repr__(self):
+        return "Layouts({})".format(", ".join(self._builders))
 
 
 # Sample layouts
-layout = {'flat':
-          {
-              's1_1.fastq.gz': str(SAMPLES_DIR / 'CHS.HG00512_1.fastq.gz'),
-              's1_2.fastq.gz': str(SAMPLES_DIR / 'CHS.HG00512_2.fastq.gz')
-          },
-          'sample': {
-              'CHS/CHS.HG00512_010101_AAABBB11XX_1.fastq.gz': str(SAMPLES_DIR / 'CHS.HG00512_1.fastq.gz'),
-              'CHS/CHS.HG00512_010101_AAABBB11XX_2.fastq.gz': str(SAMPLES_DIR / 'CHS.HG00512_2.fastq.gz')
-          }
-}
+layout = Layouts()
+layout.register('flat', functools.partial(
+    layout_from_template, "s1_{read}.fastq.gz", run="CHS.HG00512"))
+layout.register('sample', functools.partial(
+    layout_from_template, "{POP}/{SM}_{PU}_{read}.fastq.gz", run="CHS.HG00512"))
 runs = ['CHS.HG00512', 'CHS.HG00513', 'PUR.HG00731.A', 'PUR.HG00731.B', 'PUR.HG00733.A', 'PUR.HG00733.B', 'YRI.NA19238', 'YRI.NA19239']
-layout['sample_run'] = {
-    "{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz".format(SM=sm, PU=pu, read=read): str(SAMPLES_DIR / fq) for sm, pu, pop, batch, fq, read, run, pool in sampleinfo if run in runs
-}
-layout['sample_project_run'] = {
-    "{SM}/{BATCH}/{PU}/{SM}_{PU}_{read}.fastq.gz".format(SM=sm, PU=pu, BATCH=batch, read=read): str(SAMPLES_DIR / fq) for sm, pu, pop, batch, fq, read, run, pool in sampleinfo if run in runs
-}
+layout.register('sample_run', functools.partial(
+    layout_from_template, "{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz", run=runs))
+layout.register('sample_project_run', functools.partial(
+    layout_from_template, "{SM}/{BATCH}/{PU}/{SM}_{PU}_{read}.fastq.gz", run=runs))
 
 popruns = ['CHS', 'PUR', 'YRI']
-layout['pop_sample'] = {
-    "{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz".format(POP=pop, SM=sm, PU=pu, read=read): str(SAMPLES_DIR / fq) for sm, pu, pop, batch, fq, read, run, pool in sampleinfo if run in popruns
-}
-layout['pop_sample_run'] = {
-    "{POP}/{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz".format(POP=pop, SM=sm, PU=pu, read=read): str(SAMPLES_DIR / fq) for sm, pu, pop, batch, fq, read, run, pool in sampleinfo if run in popruns
-}
-layout['pop_sample_project_run'] = {
-    "{POP}/{SM}/{BATCH}/{PU}/{SM}_{PU}_{read}.fastq.gz".format(POP=pop, SM=sm, PU=pu, BATCH=batch, read=read): str(SAMPLES_DIR / fq) for sm, pu, pop, batch, fq, read, run, pool in sampleinfo if run in popruns
-}
+layout.register('pop_sample', functools.partial(
+    layout_from_template, "{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz", run=popruns))
+layout.register('pop_sample_run', functools.partial(
+    layout_from_template, "{POP}/{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz", run=popruns))
+layout.register('pop_sample_project_run', functools.partial(
+    layout_from_template, "{POP}/{SM}/{BATCH}/{PU}/{SM}_{PU}_{read}.fastq.gz", run=popruns))
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""FASTA index builder and region fetch.
+
+:py:func:`build_fai` builds a samtools compatible ``.fai`` index in a
+single pass over a FASTA file. :py:class:`FastaFile` memory maps a
+FASTA file and uses the index to fetch regions, reading only the
+lines that overlap the region.
+
+Examples:
+
+   .. code-block:: python
+
+      with FastaFile("scaffolds.fa") as fa:
+          seq = fa.fetch("scaffold1", 100, 200)
+
+The module can also be run as a script to index FASTA files:
+
+   .. code-block:: shell
+
+      python -m pytest_ngsfixtures.faidx scaffolds.fa
+"""
+import os
+import sys
+import mmap
+import logging
+from collections import namedtuple, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# File name extensions of FASTA files
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.fna')
+
+
+class FaiEntry(namedtuple("FaiEntry", ['name', 'length', 'offset', 'linebases', 'linewidth'])):
+    """FASTA index entry.
+
+    Args:
+      name (str): sequence name
+      length (int): sequence length
+      offset (int): byte offset of the first base
+      linebases (int): number of bases per line
+      linewidth (int): number of bytes per line, including the newline
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return "\t".join(str(x) for x in self)
+
+
+def build_fai(path, fai=None):
+    """Build the index of a FASTA file.
+
+    All sequence lines of a record except the last must have the same
+    length, as required by samtools faidx.
+
+    Args:
+      path (str): FASTA file name
+      fai (str): index file name to write; if None, the index is not
+                 written
+
+    Returns:
+      OrderedDict: FaiEntry index entries by sequence name
+    """
+    index = OrderedDict()
+    path = str(path)
+
+    def _add(name, length, offset, linebases, linewidth):
+        if name in index:
+            raise ValueError("{}: duplicate sequence name '{}'".format(path, name))
+        index[name] = FaiEntry(name, length, offset, linebases, linewidth)
+
+    with open(path, "rb") as fh:
+        record = None
+        pos = 0
+        for line in fh:
+            start = pos
+            pos += len(line)
+            if line.startswith(b">"):
+                if record is not None:
+                    _add(*record[:5])
+                name = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                record = [name, 0, pos, 0, 0, False]
+                continue
+            if record is None:
+                if line.strip():
+                    raise ValueError("{}: sequence before first header at byte {}".format(path, start))
+                continue
+            bases = len(line.rstrip(b"\r\n"))
+            if bases == 0:
+                record[5] = True
+                continue
+            if record[5] or bases > record[3] > 0 or \
+               (bases == record[3] and len(line) != record[4] and line.endswith(b"\n")):
+                raise ValueError("{}: different line length in sequence '{}' at byte {}".format(path, record[0], start))
+            if record[3] == 0:
+                record[3], record[4] = bases, len(line)
+            if bases < record[3] or not line.endswith(b"\n"):
+                # Only the last line of a record may be short
+                record[5] = True
+            record[1] += bases
+        if record is not None:
+            _add(*record[:5])
+    if fai is not None:
+        write_fai(index, fai)
+    return index
+
+
+def write_fai(index, fai):
+    """Write a FASTA index.
+
+    Args:
+      index (dict): FaiEntry index entries by sequence name
+      fai (str): index file name
+    """
+    with open(str(fai), "w") as fh:
+        for entry in index.values():
+            fh.write("{}\n".format(entry))
+
+
+def read_fai(fai):
+    """Read a FASTA index.
+
+    Args:
+      fai (str): index file name
+
+    Returns:
+      OrderedDict: FaiEntry index entries by sequence name
+    """
+    index = OrderedDict()
+    with open(str(fai)) as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            name, length, offset, linebases, linewidth = line.split("\t")[:5]
+            index[name] = FaiEntry(name, int(length), int(offset), int(linebases), int(linewidth))
+    return index
+
+
+class FastaFile:
+    """Memory mapped FASTA file with region fetch.
+
+    The index is read from path.fai if it is at least as recent as the
+    FASTA file. Otherwise it is built, and written to path.fai unless
+    that is a link or not writable.
+
+    Args:
+      path (str): FASTA file name
+
+    Attributes:
+      index (OrderedDict): FaiEntry index entries by sequence name
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self.index = self._load_index()
+        self._fh = open(self.path, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+
+    def __repr__(self):
+        return "FastaFile('{}')".format(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def _load_index(self):
+        fai = self.path + ".fai"
+        try:
+            if os.stat(fai).st_mtime_ns >= os.stat(self.path).st_mtime_ns:
+                return read_fai(fai)
+        except OSError:
+            pass
+        index = build_fai(self.path)
+        if os.path.islink(fai) or (os.path.exists(fai) and os.stat(fai).st_nlink > 1):
+            # Never write through links to shared fixture data
+            return index
+        try:
+            write_fai(index, fai)
+        except OSError as e:
+            logger.debug("not writing index {}: {}".format(fai, e))
+        return index
+
+    @property
+    def references(self):
+        """Sequence names, in file order"""
+        return list(self.index)
+
+    @property
+    def lengths(self):
+        """Sequence lengths, in file order"""
+        return [x.length for x in self.index.values()]
+
+    def _region(self, name, start, end):
+        try:
+            entry = self.index[name]
+        except KeyError:
+            raise KeyError("no such sequence '{}' in {}".format(name, self.path))
+        end = entry.length if end is None else min(end, entry.length)
+        if start < 0 or start > end:
+            raise ValueError("invalid region {}:{}-{}".format(name, start, end))
+        if start == end:
+            return False, 0, 0
+        first = entry.offset + start // entry.linebases * entry.linewidth + start % entry.linebases
+        last = entry.offset + (end - 1) // entry.linebases * entry.linewidth + (end - 1) % entry.linebases
+        multiline = entry.linewidth != entry.linebases and start // entry.linebases != (end - 1) // entry.linebases
+        return multiline, first, last + 1
+
+    def fetch(self, name, start=0, end=None):
+        """Fetch a region of a sequence.
+
+        Only the lines overlapping the region are read and copied into
+        bytes, with line breaks removed. See :py:meth:`fetch_view` for
+        access without copying.
+
+        Args:
+          name (str): sequence name
+          start (int): 0-based start position
+          end (int): 0-based exclusive end position; defaults to the
+                     sequence length
+
+        Returns:
+          bytes: region sequence
+        """
+        multiline, first, last = self._region(name, start, end)
+        if multiline:
+            return self._mm[first:last].replace(b"\n", b"").replace(b"\r", b"")
+        return self._mm[first:last]
+
+    def fetch_view(self, name, start=0, end=None):
+        """Fetch a region of a sequence without copying.
+
+        The region must not contain line breaks, i.e. it must lie
+        within one line or belong to a sequence stored on a single line
+        (linewidth equal to linebases). Views remain valid after
+        :py:meth:`close`; the mapping is released with the last view.
+
+        Args:
+          name (str): sequence name
+          start (int): 0-based start position
+          end (int): 0-based exclusive end position; defaults to the
+                     sequence length
+
+        Returns:
+          memoryview: read-only view of the region sequence
+
+        Raises:
+          ValueError: if the region spans lines
+        """
+        multiline, first, last = self._region(name, start, end)
+        if multiline:
+            raise ValueError("region {}:{}-{} spans lines; use fetch".format(name, start, end))
+        return memoryview(self._mm)[first:last]
+
+    def close(self):
+        """Unmap and close the FASTA file"""
+        if isinstance(self._mm, mmap.mmap):
+            try:
+                self._mm.close()
+            except BufferError:
+                # Fetched regions still refer to the mapping, which is
+                # unmapped when they are released
+                logger.debug("{}: regions in use, deferring unmap".format(self.path))
+        self._fh.close()
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if not args:
+        print("usage: python -m pytest_ngsfixtures.faidx FASTA [FASTA ...]", file=sys.stderr)
+        return 1
+    for path in args:
+        build_fai(path, path + ".fai")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Data manifest and integrity verification.
+
+The manifest :py:data:`MANIFEST` lists the size and BLAKE2b digest of
+every file in the data directories :py:data:`MANIFEST_DIRS` of
+:py:data:`~pytest_ngsfixtures.DATA_DIR`. :py:func:`verify` checks the
+data files against the manifest with a thread pool; hashing releases
+the GIL, so files are hashed in parallel.
+
+Verified files can be recorded by path, size, modification time and
+inode, so that unchanged files are not hashed again; the plugin keeps
+this state in the pytest cache (see option ``--ngs-verify-data``).
+
+To regenerate the manifest after changing the data, run
+
+   .. code-block:: shell
+
+      python -m pytest_ngsfixtures.manifest
+"""
+import os
+import sys
+import logging
+from pytest_ngsfixtures import DATA_DIR
+from pytest_ngsfixtures.os import _run
+from pytest_ngsfixtures.store import digest
+
+logger = logging.getLogger(__name__)
+
+# Manifest file name, relative to the data directory
+MANIFEST = "manifest.tsv"
+
+# Data directories covered by the manifest
+MANIFEST_DIRS = ("seq", "ref")
+
+
+def data_files(root=DATA_DIR):
+    """List the data files covered by the manifest.
+
+    Args:
+      root (str): data directory
+
+    Returns:
+      list: file names relative to root, sorted
+    """
+    root = str(root)
+    files = []
+    for d in MANIFEST_DIRS:
+        for path, dirs, names in os.walk(os.path.join(root, d)):
+            dirs[:] = sorted(x for x in dirs if not x.startswith((".", "__")))
+            files.extend(os.path.relpath(os.path.join(path, x), root) for x in names
+                         if not x.startswith("."))
+    return sorted(files)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev]
+
+
+def build_manifest(root=DATA_DIR, threads=1):
+    """Compute the manifest of a data directory.
+
+    Args:
+      root (str): data directory
+      threads (int): number of hashing threads
+
+    Returns:
+      dict: (size, digest) tuples by file name relative to root
+    """
+    root = str(root)
+    files = data_files(root)
+
+    def _entry(name):
+        path = os.path.join(root, name)
+        return name, (os.path.getsize(path), digest(path))
+
+    return dict(_run(_entry, files, threads))
+
+
+def write_manifest(manifest, path):
+    """Write a manifest.
+
+    Args:
+      manifest (dict): (size, digest) tuples by file name
+      path (str): manifest file name
+    """
+    with open(str(path), "w") as fh:
+        fh.write("path\tsize\tblake2b\n")
+        for name in sorted(manifest):
+            size, h = manifest[name]
+            fh.write("{}\t{}\t{}\n".format(name.replace(os.sep, "/"), size, h))
+
+
+def read_manifest(path=None):
+    """Read a manifest.
+
+    Args:
+      path (str): manifest file name; defaults to :py:data:`MANIFEST`
+                  in the data directory
+
+    Returns:
+      dict: (size, digest) tuples by file name
+    """
+    path = str(path or os.path.join(str(DATA_DIR), MANIFEST))
+    manifest = {}
+    with open(path) as fh:
+        next(fh)
+        for line in fh:
+            name, size, h = line.rstrip("\n").split("\t")
+            manifest[name.replace("/", os.sep)] = (int(size), h)
+    return manifest
+
+
+def verify(root=DATA_DIR, manifest=None, threads=1, state=None):
+    """Verify data files against a manifest.
+
+    Args:
+      root (str): data directory
+      manifest (dict): manifest; read from root if None
+      threads (int): number of hashing threads
+      state (dict): previously verified files, mapping file names to
+                    [size, mtime_ns, inode, device, digest]; files
+                    whose size, modification time and inode are
+                    unchanged are not hashed again
+
+    Returns:
+      tuple: list of (file name, problem) tuples, and the verified
+      state of the files that passed
+    """
+    root = str(root)
+    if manifest is None:
+        manifest = read_manifest(os.path.join(root, MANIFEST))
+    state = state or {}
+
+    def _verify(item):
+        name, (size, expected) = item
+        path = os.path.join(root, name)
+        try:
+            key = _stat_key(path)
+        except OSError:
+            return name, "missing", None
+        if key[0] != size:
+            return name, "size {} differs from manifest size {}".format(key[0], size), None
+        cached = state.get(name)
+        if cached is not None and cached[:4] == key and cached[4] == expected:
+            return name, None, cached
+        if digest(path) != expected:
+            return name, "checksum differs from manifest", None
+        return name, None, key + [expected]
+
+    results = _run(_verify, sorted(manifest.items()), threads)
+    problems = [(name, problem) for name, problem, _ in results if problem is not None]
+    verified = {name: entry for name, _, entry in results if entry is not None}
+    logger.debug("verified {} data files, {} problems".format(len(verified), len(problems)))
+    return problems, verified
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    root = args[0] if args else str(DATA_DIR)
+    manifest = build_manifest(root, threads=os.cpu_count() or 1)
+    write_manifest(manifest, os.path.join(root, MANIFEST))
+    print("wrote manifest of {} files to {}".format(len(manifest), os.path.join(root, MANIFEST)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,53 +1,591 @@
 # -*- coding: utf-8 -*-
 import os
 import py
+import stat
+import errno
+import shutil
+import functools
+import getpass
 import pathlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pytest_ngsfixtures import DATA_DIR
 
-logging.basicConfig(level=logging.INFO)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# ioctl request number for FICLONE, see ioctl_ficlone(2)
+FICLONE = 0x40049409
 
-def safe_copy(p, src, dst=None, ignore_errors=False):
-    """Safely copy fixture file.
+# Copy strategies in order of preference
+COPY_STRATEGIES = ["reflink", "copy_file_range", "sendfile", "userspace"]
 
-    Copy file from src to dst in LocalPath p. If src, dst are strings,
-    they will be joined to p, assuming they are relative to p. If src,
-    dst are LocalPath instances, they are left alone since LocalPath
-    objects are always absolute paths.
+# Error codes signalling that a strategy is not supported by the
+# source/target filesystem combination
+_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOSYS,
+                errno.EINVAL, errno.EBADF, errno.EPERM}
 
-    Args:
-      p (LocalPath): path in which link is setup
-      src (str, LocalPath): source file that link points to. If string, assume relative to pytest_ngsfixtures data directory
-      dst (str, LocalPath): link destination name. If string, assume relative to path and concatenate; else leave alone
-      ignore_errors (bool): ignore errors should target file exist
+_BUFSIZE = 1024 * 1024
 
-    Returns:
-      dst (LocalPath): link name
+
+class CopyEngine:
+    """Copy files with the fastest strategy supported by the
+    filesystems involved.
+
+    Strategies are tried in the order given by `strategies`: a FICLONE
+    reflink (btrfs, xfs), :py:func:`os.copy_file_range`,
+    :py:func:`os.sendfile` and finally a userspace read/write loop.
+    The first strategy that succeeds for a pair of (source, target)
+    devices is cached so that filesystem support is detected only
+    once per device.
+
+    Args:
+      strategies (list): strategy names in order of preference
     """
+    def __init__(self, strategies=None):
+        self.strategies = list(COPY_STRATEGIES if strategies is None else strategies)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def strategy(self, src, dst):
+        """Return the cached strategy for copying src to dst.
+
+        Args:
+          src (str): source file name
+          dst (str): target file or directory name
+
+        Returns:
+          strategy (str): strategy name or None if not yet detected
+        """
+        if not os.path.isdir(str(dst)):
+            dst = os.path.dirname(str(dst))
+        return self.cached(os.stat(str(src)).st_dev, os.stat(str(dst)).st_dev)
+
+    def cached(self, src_dev, dst_dev):
+        """Return the cached strategy for a pair of devices.
+
+        Args:
+          src_dev (int): source device
+          dst_dev (int): target device
+
+        Returns:
+          strategy (str): strategy name or None if not yet detected
+        """
+        return self._cache.get((src_dev, dst_dev))
+
+    def copy(self, src, dst, dir_fd=None):
+        """Copy file src to dst.
+
+        The target file must not exist.
+
+        Args:
+          src (str): source file name
+          dst (str): target file name
+          dir_fd (int): directory descriptor dst is relative to
+
+        Returns:
+          strategy (str): name of the strategy used
+        """
+        def opener(path, flags):
+            return os.open(path, flags, 0o666, dir_fd=dir_fd)
+
+        with open(str(src), "rb") as fsrc, open(str(dst), "xb", opener=opener) as fdst:
+            try:
+                return self._copyfd(fsrc.fileno(), fdst.fileno(), dst)
+            except BaseException:
+                os.unlink(str(dst), dir_fd=dir_fd)
+                raise
+
+    def _copyfd(self, sfd, dfd, dst):
+        st = os.fstat(sfd)
+        key = (st.st_dev, os.fstat(dfd).st_dev)
+        strategies = self.strategies
+        if key in self._cache:
+            strategies = strategies[strategies.index(self._cache[key]):]
+        for name in strategies:
+            try:
+                getattr(self, "_" + name)(sfd, dfd, st.st_size)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                logger.debug("copy strategy {} unsupported for {}: {}".format(name, dst, e))
+                os.lseek(sfd, 0, os.SEEK_SET)
+                os.lseek(dfd, 0, os.SEEK_SET)
+                os.ftruncate(dfd, 0)
+                continue
+            with self._lock:
+                self._cache[key] = name
+            return name
+        raise OSError(errno.ENOTSUP, "no copy strategy succeeded", str(dst))
+
+    @staticmethod
+    def _reflink(sfd, dfd, size):
+        if fcntl is None:
+            raise OSError(errno.ENOSYS, "fcntl not available")
+        fcntl.ioctl(dfd, FICLONE, sfd)
+
+    @staticmethod
+    def _copy_file_range(sfd, dfd, size):
+        if not hasattr(os, "copy_file_range"):
+            raise OSError(errno.ENOSYS, "copy_file_range not available")
+        while os.copy_file_range(sfd, dfd, max(size, _BUFSIZE)) > 0:
+            pass
+
+    @staticmethod
+    def _sendfile(sfd, dfd, size):
+        if not hasattr(os, "sendfile"):
+            raise OSError(errno.ENOSYS, "sendfile not available")
+        offset = 0
+        while True:
+            n = os.sendfile(dfd, sfd, offset, max(size - offset, _BUFSIZE))
+            if n == 0:
+                break
+            offset += n
+
+    @staticmethod
+    def _userspace(sfd, dfd, size):
+        while True:
+            buf = memoryview(os.read(sfd, _BUFSIZE))
+            if not buf:
+                break
+            while buf:
+                buf = buf[os.write(dfd, buf):]
+
+
+copy_engine = CopyEngine()
+
+
+def _normalize(p, src, dst=None):
+    """Normalize source and destination to LocalPath instances"""
     if isinstance(src, pathlib.PosixPath):
         src = str(src)
     if isinstance(src, str):
-        if not os.path.isabs(src):
-            src = os.path.join(DATA_DIR, src)
-        src = py.path.local(src)
+        src = localpath(src)
     if dst is None:
         dst = src.basename
     if isinstance(dst, str):
         dst = p.join(dst)
+    return src, dst
+
+
+def _copy(src, dst):
+    if dst.exists():
+        raise py.error.EEXIST("copy('{src}', '{dst}')".format(src=src, dst=dst))
+    if src.check(dir=1):
+        src.copy(dst)
+        return "userspace"
+    return copy_engine.copy(src, dst)
+
+
+def _symlink(src, dst):
+    dst.mksymlinkto(src)
+    return "symlink"
+
+
+def _hardlink(src, dst, store=None):
+    if store is None or src.check(dir=1):
+        return _copy(src, dst)
+    return store.link(src, dst)
+
+
+def _clone(src, dst, store=None):
+    if copy_engine.strategy(src, dst.dirpath()) in (None, "reflink"):
+        return _copy(src, dst)
+    return _hardlink(src, dst, store)
+
+
+# Materialization functions by fixture mode
+_MODES = {
+    'copy': _copy,
+    'symlink': _symlink,
+    'hardlink': _hardlink,
+    'auto': _clone,
+}
+
+MODES = sorted(list(_MODES) + ['store'])
+
+# Modes that use a fixture store if one is given
+STORE_MODES = ('auto', 'hardlink', 'store')
+
+_HAVE_DIR_FD = {os.open, os.mkdir, os.symlink, os.link, os.unlink}.issubset(os.supports_dir_fd)
+
+# Maximum number of files setup relative to one directory descriptor
+# by the fast path; see :py:func:`materialize_data`
+RUN_SIZE = 64
+
+
+def materialize(p, src, dst=None, mode="copy", ignore_errors=False, store=None):
+    """Safely materialize fixture file.
+
+    Materialize file src as dst in LocalPath p according to mode.
+    Source and destination are resolved as in :py:func:`safe_copy`.
+
+    The modes are
+
+    copy
+       copy the file with :py:data:`copy_engine`
+    symlink
+       make a symbolic link to the source
+    hardlink
+       make a hard link to the store entry of the source, see
+       :py:meth:`~pytest_ngsfixtures.store.FixtureStore.link`; copy
+       if no store is given. Source files are never hard linked, so
+       writing to a fixture file cannot modify the source data. Use
+       :py:func:`pytest_ngsfixtures.store.unshare` to obtain a
+       private, writable copy of a hard linked file.
+    auto
+       make a reflink clone if supported, else as hardlink
+    store
+       clone the file from a content-addressed
+       :py:class:`~pytest_ngsfixtures.store.FixtureStore`; directories
+       are copied
+
+    Args:
+      p (LocalPath): path in which file is setup
+      src (str, LocalPath): source file. If string, assume relative to pytest_ngsfixtures data directory
+      dst (str, LocalPath): destination name. If string, assume relative to path and concatenate; else leave alone
+      mode (str): materialization mode; one of copy, symlink, hardlink, auto
+      ignore_errors (bool): ignore errors should target file exist
+      store (FixtureStore): fixture store; required for mode store,
+                            used by modes hardlink and auto
+
+    Returns:
+      tuple: destination (LocalPath) and the strategy used (str), or
+      None if an error was ignored
+    """
+    if mode not in MODES:
+        raise ValueError("mode must be one of {}; got '{}'".format(", ".join(MODES), mode))
+    if mode == 'store':
+        if store is None:
+            raise ValueError("mode 'store' requires a fixture store")
+        func = store.clone
+    elif mode in STORE_MODES:
+        func = functools.partial(_MODES[mode], store=store)
+    else:
+        func = _MODES[mode]
+    src, dst = _normalize(p, src, dst)
+    if mode == 'store' and src.check(dir=1):
+        # Directories are not stored
+        func = _copy
+    strategy = None
     try:
         dst.dirpath().ensure(dir=True)
-        if dst.exists():
-            raise py.error.EEXIST("copy('{src}', '{dst}')".format(src=src, dst=dst))
-        src.copy(dst)
+        strategy = func(src, dst)
     except OSError as e:
         if ignore_errors:
             logger.warning(e)
         else:
             logger.error(e)
             raise
-    return dst
+    return dst, strategy
+
+
+def plan_data(p, data):
+    """Plan materialization of fixture data.
+
+    Resolve destinations relative to p and collect the unique
+    directories that have to be created.
+
+    Args:
+      p (LocalPath): path in which files are setup
+      data (dict): key value mapping of destination and source files
+
+    Returns:
+      tuple: list of directories relative to p, parents before
+      children, and list of (directory, file name, source) tuples in
+      data order. None if a destination is located outside p.
+    """
+    root = str(p)
+    dirs = set()
+    entries = []
+    for dst, src in data.items():
+        src = str(src)
+        if not os.path.isabs(src):
+            src = localpath(src).strpath
+        dst = str(dst)
+        if os.path.isabs(dst):
+            dst = os.path.relpath(dst, root)
+        else:
+            dst = os.path.normpath(dst)
+        if dst == os.curdir or dst.split(os.sep)[0] == os.pardir:
+            return None
+        parent, name = os.path.split(dst)
+        entries.append((parent, name, src))
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    return sorted(dirs, key=lambda x: (x.count(os.sep), x)), entries
+
+
+def _materialize_at(mode, src, dir_fd, name, store=None):
+    """Materialize src as name relative to directory descriptor dir_fd.
+
+    Returns the strategy used, or None if src has to be materialized
+    by :py:func:`materialize`."""
+    if mode == 'symlink':
+        os.symlink(src, name, dir_fd=dir_fd)
+        return 'symlink'
+    st = os.stat(src)
+    if stat.S_ISDIR(st.st_mode):
+        return None
+    if mode == 'store':
+        return store.clone(src, name, dir_fd=dir_fd)
+    if mode == 'auto' and copy_engine.cached(st.st_dev, os.fstat(dir_fd).st_dev) not in (None, "reflink"):
+        mode = 'hardlink'
+    if mode == 'hardlink' and store is not None and store.dev == os.fstat(dir_fd).st_dev:
+        os.link(str(store.add(src)), name, dst_dir_fd=dir_fd)
+        return 'hardlink'
+    return copy_engine.copy(src, name, dir_fd=dir_fd)
+
+
+def _runs(entries, size=RUN_SIZE):
+    """Split planned entries in runs of at most size consecutive
+    entries sharing a directory"""
+    runs = []
+    for entry in entries:
+        if runs and runs[-1][0][0] == entry[0] and len(runs[-1]) < size:
+            runs[-1].append(entry)
+        else:
+            runs.append([entry])
+    return runs
+
+
+def _run(func, items, threads):
+    """Apply func to items with a bounded thread pool.
+
+    Results are returned in item order. The error of the first failing
+    item, in item order, is raised; items that have not yet been
+    started are cancelled, as a serial run stops at the failing item.
+    Items already running are completed before the error is raised.
+    """
+    if threads <= 1 or len(items) <= 1:
+        return [func(x) for x in items]
+    with ThreadPoolExecutor(max_workers=min(threads, len(items))) as executor:
+        futures = [executor.submit(func, x) for x in items]
+        try:
+            return [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+
+def uptodate(src, dst, mode="copy", checksum=False):
+    """Check whether a fixture file is up to date with its source.
+
+    A symbolic link is up to date if it points to the source. Any
+    other file is up to date if it is a hard link to the source, or
+    if size and modification time match those of the source. If
+    checksum is set, a file whose size matches but whose modification
+    time differs is compared by content hash, and its modification
+    time is synchronized if the content matches.
+
+    Args:
+      src (str, LocalPath): absolute source file name
+      dst (str, LocalPath): absolute destination file name
+      mode (str): materialization mode
+      checksum (bool): compare content of files with differing modification times
+
+    Returns:
+      bool: True if dst is up to date
+    """
+    src, dst = str(src), str(dst)
+    try:
+        dst_st = os.lstat(dst)
+    except FileNotFoundError:
+        return False
+    if mode == "symlink":
+        return stat.S_ISLNK(dst_st.st_mode) and os.path.normpath(os.readlink(dst)) == os.path.normpath(src)
+    if not stat.S_ISREG(dst_st.st_mode):
+        return False
+    src_st = os.stat(src)
+    if not stat.S_ISREG(src_st.st_mode):
+        return False
+    if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return True
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if src_st.st_mtime_ns == dst_st.st_mtime_ns:
+        return True
+    if checksum:
+        from pytest_ngsfixtures.store import digest
+        if digest(src) == digest(dst):
+            os.utime(dst, ns=(dst_st.st_atime_ns, src_st.st_mtime_ns))
+            return True
+    return False
+
+
+def _remove(dst):
+    """Remove a stale fixture file or directory"""
+    dst = str(dst)
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        shutil.rmtree(dst)
+    elif os.path.lexists(dst):
+        os.unlink(dst)
+
+
+def _sync_mtime(src, dst):
+    """Set modification time of a regular fixture file to that of its source"""
+    dst_st = os.lstat(str(dst))
+    src_st = os.stat(str(src))
+    if not stat.S_ISREG(dst_st.st_mode) or (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return
+    os.utime(str(dst), ns=(dst_st.st_atime_ns, src_st.st_mtime_ns))
+
+
+def _materialize_incremental(p, data, checksum=False, **kwargs):
+    """Materialize only the entries of data that are not up to date"""
+    items = list(data.items())
+
+    def _refresh(item):
+        src, dst = _normalize(p, item[1], item[0])
+        if uptodate(src, dst, kwargs['mode'], checksum):
+            return src, dst, True
+        _remove(dst)
+        return src, dst, False
+
+    checked = _run(_refresh, items, kwargs['threads'])
+    stale = {k: v for (k, v), (_, _, current) in zip(items, checked) if not current}
+    results = iter(materialize_data(p, stale, **kwargs))
+    out = []
+    for src, dst, current in checked:
+        if current:
+            out.append((dst, "uptodate"))
+            continue
+        dst, strategy = next(results)
+        if strategy is not None and strategy != "symlink":
+            _sync_mtime(src, dst)
+        out.append((dst, strategy))
+    return out
+
+
+def materialize_data(p, data, mode="copy", ignore_errors=False, store=None, threads=1, fast=True,
+                     incremental=False):
+    """Materialize fixture data with a bounded thread pool.
+
+    Each destination:source pair of data is materialized as in
+    :py:func:`materialize`. If errors are not ignored, the error of the
+    first failing entry, in data order, is raised and entries that
+    have not yet been started are skipped.
+
+    In fast mode, the layout is first planned with
+    :py:func:`plan_data`. The unique directories are created in one
+    pass, after which files are setup with :py:mod:`os` calls
+    relative to directory descriptors. Consecutive entries sharing a
+    directory are processed in runs of at most :py:data:`RUN_SIZE`
+    files; a directory descriptor is held open only while its run is
+    processed, so that at most one descriptor per thread is open,
+    whatever the number of directories. Layouts that cannot be
+    planned, and directory sources, fall back to
+    :py:func:`materialize`.
+
+    Args:
+      p (LocalPath): path in which files are setup
+      data (dict): key value mapping of destination and source files
+      mode (str): materialization mode
+      ignore_errors (bool): ignore errors should target file exist
+      store (FixtureStore): fixture store; required for mode store,
+                            used by modes hardlink and auto
+      threads (int): maximum number of threads
+      fast (bool): use the planned fast path if possible
+      incremental (bool, str): only replace files that are missing or
+                               not up to date, as determined by
+                               :py:func:`uptodate`. If 'hash', compare
+                               content hashes of files whose size
+                               matches but whose modification time
+                               differs. Up to date files are reported
+                               with strategy 'uptodate'
+
+    Returns:
+      list: (destination, strategy) tuples in data order
+    """
+    if incremental:
+        return _materialize_incremental(p, data, checksum=incremental == "hash", mode=mode,
+                                        ignore_errors=ignore_errors, store=store,
+                                        threads=threads, fast=fast)
+    plan = None
+    if mode == 'store' and store is None:
+        raise ValueError("mode 'store' requires a fixture store")
+    if fast and mode in MODES and _HAVE_DIR_FD:
+        plan = plan_data(p, data)
+    if plan is None:
+        def _materialize(item):
+            return materialize(p, item[1], item[0], mode=mode,
+                               ignore_errors=ignore_errors, store=store)
+
+        return _run(_materialize, list(data.items()), threads)
+
+    dirs, entries = plan
+    root = str(p)
+    os.makedirs(root, exist_ok=True)
+    root_fd = os.open(root, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for d in dirs:
+            try:
+                os.mkdir(d, dir_fd=root_fd)
+            except FileExistsError:
+                pass
+
+        def _materialize(dir_fd, parent, name, src):
+            dst = os.path.join(root, parent, name)
+            strategy = None
+            try:
+                strategy = _materialize_at(mode, src, dir_fd, name, store)
+            except OSError as e:
+                e = OSError(e.errno, e.strerror, dst)
+                if ignore_errors:
+                    logger.warning(e)
+                else:
+                    logger.error(e)
+                    raise e
+            else:
+                if strategy is None:
+                    return materialize(p, src, os.path.join(parent, name), mode=mode,
+                                       ignore_errors=ignore_errors, store=store)
+            return py.path.local(dst), strategy
+
+        def _materialize_run(run):
+            parent = run[0][0]
+            if len(run) == 1 or not parent:
+                # Not worth a descriptor of its own; resolve relative to root
+                return [_materialize(root_fd, '', os.path.join(parent, name), src)
+                        for parent, name, src in run]
+            dir_fd = os.open(parent, os.O_RDONLY | os.O_DIRECTORY, dir_fd=root_fd)
+            try:
+                return [_materialize(dir_fd, parent, name, src) for _, name, src in run]
+            finally:
+                os.close(dir_fd)
+
+        results = _run(_materialize_run, _runs(entries), threads)
+        return [x for run in results for x in run]
+    finally:
+        os.close(root_fd)
+
+
+def safe_copy(p, src, dst=None, ignore_errors=False):
+    """Safely copy fixture file.
+
+    Copy file from src to dst in LocalPath p. If src, dst are strings,
+    they will be joined to p, assuming they are relative to p. If src,
+    dst are LocalPath instances, they are left alone since LocalPath
+    objects are always absolute paths. Files are copied with
+    :py:data:`copy_engine`.
+
+    Args:
+      p (LocalPath): path in which link is setup
+      src (str, LocalPath): source file that link points to. If string, assume relative to pytest_ngsfixtures data directory
+      dst (str, LocalPath): link destination name. If string, assume relative to path and concatenate; else leave alone
+      ignore_errors (bool): ignore errors should target file exist
+
+    Returns:
+      dst (LocalPath): link name
+    """
+    return materialize(p, src, dst, mode="copy", ignore_errors=ignore_errors)[0]
 
 
 def safe_symlink(p, src, dst=None, ignore_errors=False):
@@ -67,44 +605,232 @@ def safe_symlink(p, src, dst=None, ignore_errors=False):
     Returns:
       dst (LocalPath): link name
     """
-    if isinstance(src, pathlib.PosixPath):
-        src = str(src)
-    if isinstance(src, str):
-        if not os.path.isabs(src):
-            src = os.path.join(DATA_DIR, src)
-        src = py.path.local(src)
-    if dst is None:
-        dst = src.basename
-    if isinstance(dst, str):
-        dst = p.join(dst)
+    return materialize(p, src, dst, mode="symlink", ignore_errors=ignore_errors)[0]
+
+
+def safe_hardlink(p, src, dst=None, ignore_errors=False, store=None):
+    """Safely make hard link.
+
+    Make dst in LocalPath p a hard link to the entry of src in store,
+    falling back to copying if no store is given or the store and dst
+    are located on different devices. Source and destination are
+    resolved as in :py:func:`safe_symlink`.
+
+    Args:
+      p (LocalPath): path in which link is setup
+      src (str, LocalPath): source file that link points to. If string, assume relative to pytest_ngsfixtures data directory
+      dst (str, LocalPath): link destination name. If string, assume relative to path and concatenate; else leave alone
+      ignore_errors (bool): ignore errors should target file exist
+      store (FixtureStore): fixture store
+
+    Returns:
+      dst (LocalPath): link name
+    """
+    return materialize(p, src, dst, mode="hardlink", ignore_errors=ignore_errors, store=store)[0]
+
+
+# Default root for fixtures on a RAM-backed filesystem
+TMPFS_ROOT = "/dev/shm"
+
+
+def mkdir_numbered(p):
+    """Make the next free numbered directory pN.
+
+    The number is one more than the highest existing number. Creation
+    is atomic; should another thread or process make the same
+    directory first, the next number is tried.
+
+    Args:
+      p (LocalPath): directory name without number
+
+    Returns:
+      p (LocalPath): numbered directory
+    """
+    parent = p.dirpath()
+    os.makedirs(str(parent), exist_ok=True)
+    n = [x.basename[len(p.basename):] for x in parent.listdir(p.basename + "*")]
+    i = max([int(x) for x in n if x.isdigit()] + [-1]) + 1
+    while True:
+        try:
+            return parent.join("{}{}".format(p.basename, i)).mkdir()
+        except py.error.EEXIST:
+            i += 1
+
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(size):
+    """Parse a size string such as 512M or 2G to a number of bytes"""
+    if isinstance(size, int):
+        return size
+    size = str(size).strip().upper().rstrip("B")
+    unit = size[-1:] if size[-1:] in _SIZE_UNITS else ''
+    return int(float(size[:len(size) - len(unit)]) * _SIZE_UNITS[unit])
+
+
+def _user():
+    """Get the user name for use in directory names"""
     try:
-        dst.dirpath().ensure(dir=True)
-        dst.mksymlinkto(src)
-    except OSError as e:
-        if ignore_errors:
-            logger.warning(e)
-        else:
-            logger.error(e)
-            raise
-    return dst
+        user = getpass.getuser()
+    except Exception:
+        user = str(os.getuid()) if hasattr(os, "getuid") else "unknown"
+    return user.replace(os.sep, "_")
 
 
-def safe_mktemp(tmpdir_factory, dirname=None, **kwargs):
-    """Safely make directory"""
+class FixtureRoot:
+    """Temporary directory factory rooted at an arbitrary directory.
+
+    Provides the getbasetemp and mktemp methods of pytest's
+    TempdirFactory. The base directory is a numbered, per user session
+    directory in root, pytest-ngsfixtures-USER-N, that is removed by
+    :py:meth:`cleanup` at the end of the session. Session directories
+    left behind by interrupted sessions are pruned, keeping the three
+    most recent.
+
+    Args:
+      root (str): root directory, e.g. on a RAM-backed filesystem
+      budget (int): maximum number of bytes to setup in root
+
+    Attributes:
+      used (int): number of bytes reserved in root
+    """
+    def __init__(self, root, budget=None):
+        self.root = py.path.local(root)
+        self.budget = budget
+        self.prefix = "pytest-ngsfixtures-{}-".format(_user())
+        self.used = 0
+        self._reserved = {}
+        self._basetemp = None
+        self._lock = threading.Lock()
+
+    def getbasetemp(self):
+        with self._lock:
+            if self._basetemp is None:
+                self.root.ensure(dir=True)
+                self._basetemp = py.path.local.make_numbered_dir(
+                    prefix=self.prefix, rootdir=self.root, keep=3)
+        return self._basetemp
+
+    def mktemp(self, basename, numbered=True):
+        p = self.getbasetemp().join(basename)
+        if not numbered:
+            return p.mkdir()
+        return mkdir_numbered(p)
+
+    def reserve(self, size, key=None):
+        """Reserve space for size bytes in root.
+
+        Args:
+          size (int): number of bytes
+          key (str): directory the space is reserved for; a directory
+                     that is setup again, replacing its files, is only
+                     charged for the size exceeding its earlier
+                     reservation
+
+        Returns:
+          bool: True if size fits in the budget and the free space of root
+        """
+        st = os.statvfs(str(self.root.ensure(dir=True)))
+        with self._lock:
+            charge = size - self._reserved.get(key, 0) if key is not None else size
+            if charge <= 0:
+                return True
+            if self.budget is not None and self.used + charge > self.budget:
+                return False
+            if charge > st.f_bavail * st.f_frsize:
+                return False
+            self.used += charge
+            if key is not None:
+                self._reserved[key] = size
+            return True
+
+    def cleanup(self):
+        """Remove the session directory and release all reservations"""
+        with self._lock:
+            if self._basetemp is not None:
+                shutil.rmtree(str(self._basetemp), ignore_errors=True)
+                current = self.root.join(self.prefix + "current")
+                if current.islink() and current.readlink() == str(self._basetemp):
+                    current.remove()
+                logger.debug("removed fixture root session directory {}".format(self._basetemp))
+            self._basetemp = None
+            self._reserved.clear()
+            self.used = 0
+
+
+_roots = {}
+_roots_lock = threading.Lock()
+
+
+def fixture_root(root, budget=None):
+    """Get the session :py:class:`FixtureRoot` for root"""
+    root = str(root)
+    with _roots_lock:
+        if root not in _roots:
+            _roots[root] = FixtureRoot(root, budget=budget)
+        return _roots[root]
+
+
+def cleanup_fixture_roots():
+    """Remove the session directories of all fixture roots"""
+    with _roots_lock:
+        roots = list(_roots.values())
+        _roots.clear()
+    for froot in roots:
+        froot.cleanup()
+
+
+def safe_mktemp(tmpdir_factory, dirname=None, root=None, size=0, budget=None, **kwargs):
+    """Safely make directory
+
+    Args:
+      tmpdir_factory (TempdirFactory): factory used to make directory
+      dirname (str): directory name relative to the factory base directory
+      root (str): fixture root directory, e.g. on a RAM-backed
+                  filesystem such as /dev/shm, that overrides
+                  tmpdir_factory
+      size (int): projected size in bytes of the directory contents
+      budget (int, str): maximum number of bytes to setup in root. If
+                         the projected size exceeds the remaining
+                         budget or the free space of root, the
+                         directory is made with tmpdir_factory
+
+    Keyword Args:
+      numbered (bool): make numbered directory
+
+    Directories are made without a check-then-create step, so
+    concurrent calls with the same dirname, e.g. from threads or
+    pytest-xdist workers sharing a fixture root, are safe.
+    """
+    if root is not None:
+        froot = fixture_root(root, budget=None if budget is None else parse_size(budget))
+        key = None if dirname is None or kwargs.get("numbered", False) else dirname
+        if froot.reserve(size, key=key):
+            tmpdir_factory = froot
+        else:
+            logger.info("projected size {} of '{}' exceeds budget of fixture root {}; falling back to {}".format(
+                size, dirname, root, tmpdir_factory.getbasetemp()))
     if dirname is None:
         return tmpdir_factory.getbasetemp()
-    else:
-        p = tmpdir_factory.getbasetemp().join(dirname).ensure(dir=True)
-        if kwargs.get("numbered", False):
-            p = tmpdir_factory.mktemp(dirname)
-        else:
-            p = tmpdir_factory.getbasetemp().join(dirname)
-            if not p.check(dir=1):
-                p = tmpdir_factory.mktemp(dirname, numbered=False)
-        return p
+    p = tmpdir_factory.getbasetemp().join(dirname)
+    if kwargs.get("numbered", False):
+        return mkdir_numbered(p)
+    os.makedirs(str(p), exist_ok=True)
+    return p
 
 
 def localpath(src, path=DATA_DIR):
-    """Generate a py.path.local path given a source and a path"""
+    """Generate a py.path.local path given a source and a path.
+
+    Compressed references in the data directory, such as
+    ref/scaffolds.fa, resolve to their decompressed copy in the user
+    cache (see :py:mod:`pytest_ngsfixtures.refcache`).
+    """
     assert os.path.isabs(path), "path argument must be an absolute path"
-    return py.path.local(os.path.join(path, src))
+    p = os.path.join(path, src)
+    if not os.path.exists(p) and os.path.dirname(p) == str(DATA_DIR / "ref"):
+        from pytest_ngsfixtures.refcache import REFERENCES, reference
+        if os.path.basename(p) in REFERENCES:
+            p = reference(os.path.basename(p))
+    return py.path.local(p)
@@ -1,12 +1,36 @@
 # -*- coding: utf-8 -*-
 """Plugin configuration module for pytest-ngsfixtures"""
 import os
+import re
+import py
+import json
+import hashlib
+import time
 import pytest
+import logging
+import threading
+import weakref
+from collections import Counter
 from py._path.local import LocalPath
-from pytest_ngsfixtures.config import layout, reflayout
-from pytest_ngsfixtures.os import safe_mktemp, safe_copy, safe_symlink
+from pytest_ngsfixtures import config as ngsconfig
+from pytest_ngsfixtures.config import layout, refselect
+from pytest_ngsfixtures.os import safe_mktemp, materialize_data, localpath, cleanup_fixture_roots, TMPFS_ROOT, STORE_MODES
+from pytest_ngsfixtures.store import get_store, stores, xdist_worker
+from pytest_ngsfixtures.sampletable import SampleTable, fanout
+from pytest_ngsfixtures.template import layout_from_template, compile_template
+from pytest_ngsfixtures.faidx import FastaFile, FASTA_EXTENSIONS
+from pytest_ngsfixtures.seqdict import write_sidecars, SIDECARS
+
+logger = logging.getLogger(__name__)
 
 _help_ngs_threads = "set the number of threads to use in test"
+_help_ngs_materialize_threads = "number of threads used to setup fixture data (default: --ngs-threads)"
+_help_ngs_fixture_root = "setup fixture directories in this directory, e.g. on a RAM-backed filesystem such as /dev/shm"
+_help_ngs_xdist_store = "under pytest-xdist, setup fixtures without an explicit mode by cloning from a fixture store shared by all workers"
+_help_ngs_io_report = "write fixture I/O statistics as json to PATH (default: ngsfixtures-io.json)"
+_help_ngs_io_report_top = "number of slowest fixtures listed in the ngsfixtures io terminal summary (default: 10)"
+_help_ngs_verify_data = "verify the packaged data files against the data manifest at session start"
+_help_ngs_fixture_root_budget = "maximum number of bytes (e.g. 512M, 2G) to setup in the fixture root before falling back to the pytest basetemp"
 
 
 def pytest_addoption(parser):
@@ -19,9 +43,138 @@ def pytest_addoption(parser):
         default=1,
         help=_help_ngs_threads,
     )
+    group.addoption(
+        '--ngs-fixture-root',
+        action="store",
+        dest="ngs_fixture_root",
+        default=None,
+        help=_help_ngs_fixture_root,
+    )
+    group.addoption(
+        '--ngs-xdist-store',
+        action="store_true",
+        dest="ngs_xdist_store",
+        default=False,
+        help=_help_ngs_xdist_store,
+    )
+    group.addoption(
+        '--ngs-io-report',
+        action="store",
+        dest="ngs_io_report",
+        default=None,
+        metavar="json[:PATH]",
+        help=_help_ngs_io_report,
+    )
+    group.addoption(
+        '--ngs-verify-data',
+        action="store_true",
+        dest="ngs_verify_data",
+        default=False,
+        help=_help_ngs_verify_data,
+    )
+    parser.addini(
+        "ngs_materialize_threads",
+        help=_help_ngs_materialize_threads,
+        default=None,
+    )
+    parser.addini(
+        "ngs_fixture_root_budget",
+        help=_help_ngs_fixture_root_budget,
+        default="1G",
+    )
+    parser.addini(
+        "ngs_io_report_top",
+        help=_help_ngs_io_report_top,
+        default="10",
+    )
+
+
+IO_REPORT_PROPERTY = "ngsfixtures_io"
+
+# pytest cache key of the verified data files
+VERIFY_CACHE_KEY = "ngsfixtures/verified-data"
+
+# File name extensions of FASTQ files
+FASTQ_EXTENSIONS = ('.fastq.gz', '.fq.gz', '.fastq', '.fq')
+
+# FASTQ files of read pairs; groups are prefix, read number and extension
+FASTQ_PAIR_RE = re.compile(r"^(.*)_R?([12])(\.f(?:ast)?q(?:\.gz)?)$")
+
+# Default layout template of scaled sample fixtures
+SCALE_LAYOUT_TEMPLATE = "{POP}/{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz"
+
+
+def io_report_path(config):
+    """Get the json I/O report path from the --ngs-io-report option.
+
+    Returns:
+      str: report path, or None if no report was requested
+    """
+    value = config.getoption("ngs_io_report")
+    if value is None:
+        return None
+    fmt, _, path = value.partition(":")
+    if fmt != "json":
+        raise pytest.UsageError("--ngs-io-report: unsupported report format '{}'; use json[:PATH]".format(fmt))
+    return path or "ngsfixtures-io.json"
+
+
+class IOReporter:
+    """Collect fixture I/O reports and summarize them.
+
+    Fixtures add their :py:meth:`Fixture.io_report` to the reporter at
+    teardown. If a report file is requested with --ngs-io-report, they
+    also attach it to the user properties of the test item, through
+    which reports are collected from pytest-xdist workers.
+
+    Args:
+      config (_pytest.config.Config): pytest config object
+
+    Attributes:
+      reports (list): fixture I/O reports
+    """
+    def __init__(self, config):
+        self.config = config
+        self.path = io_report_path(config)
+        self.reports = []
+
+    def add(self, report):
+        """Add a fixture I/O report.
+
+        Args:
+          report (dict): fixture I/O report
+        """
+        self.reports.append(report)
+
+    def pytest_runtest_logreport(self, report):
+        # Only reports of pytest-xdist workers carry the node; local
+        # fixtures add their reports directly
+        if report.when != "teardown" or getattr(report, "node", None) is None:
+            return
+        for name, value in report.user_properties:
+            if name == IO_REPORT_PROPERTY:
+                self.reports.append(value)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.reports:
+            return
+        terminalreporter.write_sep("-", "ngsfixtures io")
+        terminalreporter.write_line("{} fixtures: {} files, {} bytes in {:.3f}s".format(
+            len(self.reports), sum(x['files'] for x in self.reports),
+            sum(x['bytes'] for x in self.reports), sum(x['elapsed'] for x in self.reports)))
+        top = int(self.config.getini("ngs_io_report_top"))
+        for x in sorted(self.reports, key=lambda x: x['elapsed'], reverse=True)[:top]:
+            terminalreporter.write_line("{:.3f}s {} files {} bytes {}::{} {}".format(
+                x['elapsed'], x['files'], x['bytes'], x['nodeid'], x['fixture'],
+                " ".join("{}={}".format(k, v) for k, v in sorted(x['strategies'].items()))))
+        if self.path is not None:
+            with open(self.path, "w") as fh:
+                json.dump(self.reports, fh, indent=2)
+            terminalreporter.write_line("wrote fixture I/O report to {}".format(self.path))
 
 
 def pytest_configure(config):
+    config.pluginmanager.register(IOReporter(config), "ngsfixtures-io")
     # Create a default TempdirFactory and attach it to pytest
     from _pytest.tmpdir import TempdirFactory, TempPathFactory
     tmppath_handler = TempPathFactory.from_config(config)
@@ -40,6 +193,104 @@ def pytest_configure(config):
     )
 
 
+def pytest_sessionstart(session):
+    config = session.config
+    if not config.getoption("ngs_verify_data") or xdist_worker() is not None:
+        return
+    from pytest_ngsfixtures import DATA_DIR
+    from pytest_ngsfixtures.manifest import verify
+    cache = getattr(config, "cache", None)
+    cached = cache.get(VERIFY_CACHE_KEY, {}) if cache is not None else {}
+    root = str(DATA_DIR)
+    state = cached.get('files') if cached.get('root') == root else None
+    threads = int(config.getini("ngs_materialize_threads") or 0) or os.cpu_count() or 1
+    problems, verified = verify(root, threads=threads, state=state)
+    if cache is not None:
+        cache.set(VERIFY_CACHE_KEY, {'root': root, 'files': verified})
+    if problems:
+        pytest.exit("pytest-ngsfixtures data files in {} do not match the manifest; reinstall the package:\n{}".format(
+            root, "\n".join("  {}: {}".format(*x) for x in problems)), returncode=pytest.ExitCode.INTERNAL_ERROR)
+
+
+def pytest_sessionfinish(session):
+    # Fixture roots are typically RAM-backed; release them
+    cleanup_fixture_roots()
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not stores():
+        return
+    terminalreporter.write_sep("-", "ngsfixtures store")
+    for s in stores():
+        terminalreporter.write_line("{}: {} hits, {} misses".format(s.path, s.hits, s.misses))
+
+
+# Strategies that copy file data; links and reflink clones share the
+# data of their source
+_COPY_DATA_STRATEGIES = ("copy_file_range", "sendfile", "userspace")
+
+
+def _size(path):
+    """Size in bytes of a file, or of the files in a directory"""
+    st = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path):
+        return st.st_size
+    return sum(os.lstat(os.path.join(root, x)).st_size
+               for root, _, files in os.walk(path) for x in files)
+
+
+def fixture_cachedir(request, name):
+    """Get a cache directory for generated fixture files.
+
+    Args:
+      request (_pytest.fixtures.SubRequest): pytest request object
+      name (str): cache directory name
+
+    Returns:
+      str: directory name in the pytest cache directory, or in the
+      basetemp directory if the cache is disabled
+    """
+    config = request.config if request is not None else None
+    if config is not None and getattr(config, "cache", None) is not None:
+        return str(config.cache.makedir(name))
+    return str(pytest.tmpdir_factory.getbasetemp().join(name))
+
+
+def fixture_root(request, tmpfs=None):
+    """Get the fixture root directory options for a request.
+
+    Args:
+      request (_pytest.fixtures.SubRequest): pytest request object
+      tmpfs (bool): setup fixture in the --ngs-fixture-root directory,
+                    or /dev/shm if unset. If None, the fixture root is
+                    used if --ngs-fixture-root is set
+
+    Returns:
+      dict: root and budget options to :py:func:`~pytest_ngsfixtures.os.safe_mktemp`
+    """
+    root = None
+    budget = None
+    if request is not None:
+        root = request.config.getoption("ngs_fixture_root")
+        budget = request.config.getini("ngs_fixture_root_budget")
+    if tmpfs is False:
+        return {}
+    if tmpfs and root is None:
+        if not os.path.isdir(TMPFS_ROOT):
+            logger.info("{} not found; setting up fixture on disk".format(TMPFS_ROOT))
+            return {}
+        root = TMPFS_ROOT
+    if root is None:
+        return {}
+    return {'root': root, 'budget': budget}
+
+
+def _close_fasta(fasta):
+    for fa in fasta.values():
+        fa.close()
+    fasta.clear()
+
+
 class Fixture(LocalPath):
     """Fixture class to setup fixture represented as a
     :py:class:`~py._path.local.LocalPath` object pointing to the root
@@ -50,27 +301,143 @@ class Fixture(LocalPath):
       request (_pytest.fixtures.SubRequest): pytest request object
       datakey (str): data key label
       path (str): test directory path; overrides call to tmpdir_factory
+      tmpdir_factory (TempdirFactory): factory used to make the test
+                                       directory and to locate the
+                                       fixture store if request is
+                                       None; defaults to the session
+                                       factory pytest.tmpdir_factory
 
     Keyword Args:
-      copy (bool): copy or link data
+      bundles (list): restrict data to reference bundles or files,
+                      including their sidecar files; see
+                      :py:func:`~pytest_ngsfixtures.config.refselect`
+      copy (bool): copy or link data; ignored if mode is set
       data (dict): key value mapping of destination and source files
       dirname (str): fixture directory; prefixed by testunit if provided
+      downsample (float): subsample the FASTQ files in data to this
+                          fraction of reads; see
+                          :py:func:`~pytest_ngsfixtures.subsample.subsample`.
+                          Read pairs, named by _1/_2 or _R1/_R2, are
+                          sampled in sync. Subsampled files are cached
+                          in the pytest cache directory
       ignore_errors (bool): ignore errors should target file exist
+      incremental (bool, str): when reusing a non-numbered fixture
+                               directory, only replace files that are
+                               missing or differ from their source in
+                               size or modification time. If 'hash',
+                               also compare content hashes; see
+                               :py:func:`~pytest_ngsfixtures.os.uptodate`
+      layout_template (str): build data from a layout template, e.g.
+                             "{POP}/{SM}/{SM}_{read}.fastq.gz", over
+                             the sample table selection; see
+                             :py:func:`~pytest_ngsfixtures.template.layout_from_template`
+      lazy (bool): create the fixture directory but materialize each
+                   file on first access through :py:meth:`join`,
+                   :py:meth:`listdir`, :py:meth:`visit`,
+                   ``os.fspath`` or :py:meth:`materialize`. Note that
+                   ``str(fixture)`` does not materialize any files
+      n_reads (int): subsample the FASTQ files in data to this number
+                     of reads; see downsample
+      mode (str): materialization mode (copy, symlink, hardlink, auto
+                  or store); see :py:func:`~pytest_ngsfixtures.os.materialize`.
+                  If unset, store is used in pytest-xdist workers
+                  run with --ngs-xdist-store
       numbered (bool): create numbered test directories
+      pool (dict, list): add pooled samples, mapping pool names to
+                         lists of samples. A sample matches the FASTQ
+                         files in data whose name, without read number
+                         and extension, equals the sample or starts
+                         with the sample followed by an underscore.
+                         Pooled files, e.g. {pool}_1.fastq.gz, are
+                         concatenated gzip members of the sample files,
+                         see :py:func:`~pytest_ngsfixtures.bgzf.concatenate`,
+                         and cached in the pytest cache directory. A
+                         list is pooled as a sample named pool
+      samplesheet (str): name of the sample sheet written for scaled
+                         fixtures
+      seed (int): random seed of downsample and n_reads
+      simulate (dict): simulate paired-end reads with these parameters
+                       instead of using the bundled sequence files;
+                       see :py:func:`~pytest_ngsfixtures.simulate.simulate`.
+                       Simulated files are cached in the pytest cache
+                       directory
+      scale (int): generate data for this many virtual samples that
+                   reuse the bundled sequence files; see
+                   :py:func:`~pytest_ngsfixtures.sampletable.fanout`.
+                   The layout is given by layout_template, or
+                   :py:data:`SCALE_LAYOUT_TEMPLATE` if unset, the mode
+                   defaults to symlink, and a sample sheet of the
+                   fixture files is written to the fixture directory
+      sidecars (bool, list): generate missing FASTA index, sequence
+                             dictionary, interval list and chromosome
+                             sizes files of the FASTA files in data, or
+                             only the given sidecar suffixes (e.g.
+                             ['.dict']); see
+                             :py:func:`~pytest_ngsfixtures.seqdict.write_sidecars`
+      selection (dict): sample table selection used with
+                        layout_template, e.g. {'pop': 'PUR'}
       testunit (str): group tests in directory named testunit relative to tmpdir_factory basename
+      tmpfs (bool): setup fixture in the --ngs-fixture-root
+                    directory, or /dev/shm if unset, provided the
+                    projected size fits the ngs_fixture_root_budget
+                    ini option. If None, the fixture root is used if
+                    --ngs-fixture-root is set
+      threads (int): number of threads used to setup data; defaults to
+                     the ngs_materialize_threads ini option or
+                     --ngs-threads
+
+    Attributes:
+      sampletable (SampleTable): sample table of the fixture files of
+                                 a scaled fixture, else None
+      io (Counter): number of files and bytes setup and elapsed time
+                    in seconds. Bytes only count files whose data was
+                    copied, not links, reflink clones or up to date
+                    files
+      strategies (Counter): number of files setup by each strategy
+                            (e.g. reflink, copy_file_range, hardlink,
+                            symlink, or uptodate for files left in
+                            place by an incremental setup)
     """
-    def __init__(self, name='testdata', request=None, datakey='data', path=None, **kwargs):
+    def __init__(self, name='testdata', request=None, datakey='data', path=None, tmpdir_factory=None, **kwargs):
+        self.strategies = Counter()
+        self.io = Counter(files=0, bytes=0, elapsed=0.0)
+        self.sampletable = None
+        self._pending = {}
+        self._fasta = {}
+        self._lock = threading.RLock()
         self._name = name
         self._request = request
+        self._tmpdir_factory = tmpdir_factory
+        # Close FASTA files at teardown, or once the fixture is garbage
+        # collected if there is no request
+        weakref.finalize(self, _close_fasta, self._fasta)
+        if request is not None:
+            request.addfinalizer(self.close)
         self._datakey = datakey
         self._path = path
         self._d = {
+            'bundles': None,
             'copy': True,
             'data': {},
             'dirname': '',
+            'downsample': None,
             'ignore_errors': False,
+            'incremental': False,
+            'layout_template': None,
+            'lazy': False,
+            'mode': None,
+            'n_reads': None,
             'numbered': False,
+            'pool': None,
+            'samplesheet': 'samplesheet.tsv',
+            'seed': None,
+            'scale': None,
+            'simulate': None,
+            'selection': None,
+            'sidecars': False,
             'testunit': '',
+            'threads': None,
+            'tmpfs': None,
         }
         self._d[datakey] = {}
         self._d.update(**kwargs)
@@ -78,8 +445,26 @@ class Fixture(LocalPath):
             self._update_options()
         if self._datakey != 'data':
             self._d['data'] = self._d[self._datakey]
+        if self._d['simulate']:
+            self._setup_simulate()
+        elif self._d['scale']:
+            self._setup_scale()
+        elif self._d['layout_template'] is not None:
+            self._d['data'] = layout_from_template(self._d['layout_template'], **(self._d['selection'] or {}))
         assert isinstance(self._d['data'], dict), "'data' option must be a dictionary of dst:src value pairs"
+        if self._d['bundles'] is not None:
+            self._d['data'] = refselect(self._d['bundles'], layout=self._d['data'])
+        if self._d['n_reads'] is not None or self._d['downsample'] is not None:
+            self._setup_subsample()
+        if self._d['pool']:
+            self._setup_pool()
         self._setup_fixture_data()
+        if self._d['sidecars']:
+            self._setup_sidecars()
+        if self.sampletable is not None:
+            self.sampletable.to_file(os.path.join(self.strpath, self._d['samplesheet']))
+        if self._request is not None:
+            self._request.addfinalizer(self._add_io_report)
 
     def keys(self):
         return self._d.keys()
@@ -90,31 +475,290 @@ class Fixture(LocalPath):
     def __iter__(self):
         return iter(self._d)
 
+    def join(self, *args, **kwargs):
+        p = super().join(*args, **kwargs)
+        if self.__dict__.get('_pending'):
+            rel = p.relto(self)
+            if rel:
+                self.materialize(rel)
+        return p
+
+    def listdir(self, *args, **kwargs):
+        self.materialize()
+        return super().listdir(*args, **kwargs)
+
+    def visit(self, *args, **kwargs):
+        self.materialize()
+        return super().visit(*args, **kwargs)
+
+    def __fspath__(self):
+        self.materialize()
+        return super().__fspath__()
+
+    def materialize(self, *paths):
+        """Materialize files of a lazy fixture.
+
+        Args:
+          paths (str): file or directory names, relative to the
+                       fixture, to materialize. If none are given, all
+                       remaining files are materialized.
+        """
+        if not self.__dict__.get('_pending'):
+            return
+        with self._lock:
+            if paths:
+                paths = [os.path.normpath(x) for x in paths]
+                data = {k: v for k, v in self._pending.items()
+                        if any(k == x or k.startswith(x + os.sep) for x in paths)}
+            else:
+                data = dict(self._pending)
+            for k in data:
+                del self._pending[k]
+            if data:
+                self._materialize(data)
+
+    def _materialize(self, data):
+        start = time.perf_counter()
+        # A plain path, as joining the fixture from the worker threads
+        # would materialize lazy files while the lock is held
+        results = materialize_data(py.path.local(self.strpath), data, **self._options)
+        for dst, strategy in results:
+            if strategy is None:
+                continue
+            self.strategies[strategy] += 1
+            self.io['files'] += 1
+            if strategy in _COPY_DATA_STRATEGIES:
+                self.io['bytes'] += _size(str(dst))
+        self.io['elapsed'] += time.perf_counter() - start
+        logger.debug("setup fixture {} using strategies {}".format(self, dict(self.strategies)))
+
+    def fetch(self, name, start=0, end=None, fasta=None):
+        """Fetch a region of a reference sequence.
+
+        FASTA files are memory mapped and indexed on first use; see
+        :py:class:`~pytest_ngsfixtures.faidx.FastaFile`.
+
+        Examples:
+
+           .. code-block:: python
+
+              def test_region(ref):
+                  seq = ref.fetch("scaffold1", 100, 200)
+
+        Args:
+          name (str): sequence name
+          start (int): 0-based start position
+          end (int): 0-based exclusive end position; defaults to the
+                     sequence length
+          fasta (str): FASTA file, relative to the fixture; defaults
+                       to the first FASTA file, in sorted order, that
+                       contains sequence name
+
+        Returns:
+          bytes: region sequence; see
+          :py:meth:`pytest_ngsfixtures.faidx.FastaFile.fetch`
+        """
+        if fasta is None:
+            candidates = sorted(k for k in self._d['data'] if k.endswith(FASTA_EXTENSIONS))
+        else:
+            candidates = [fasta]
+        for k in candidates:
+            fa = self._fasta_file(k)
+            if name in fa or fasta is not None:
+                return fa.fetch(name, start, end)
+        raise KeyError("no such sequence '{}' in FASTA files {}".format(name, ", ".join(candidates)))
+
+    def _fasta_file(self, fasta):
+        with self._lock:
+            if fasta not in self._fasta:
+                self._fasta[fasta] = FastaFile(self.join(fasta).strpath)
+            return self._fasta[fasta]
+
+    def close(self):
+        """Close the FASTA files opened by :py:meth:`fetch`.
+
+        Called at fixture teardown, or when the fixture is garbage
+        collected if it was created without a request. Files are
+        reopened by a later fetch.
+        """
+        with self._lock:
+            _close_fasta(self._fasta)
+
+    def io_report(self):
+        """Report fixture I/O statistics.
+
+        Returns:
+          dict: fixture name, test node id, path, number of files and
+          bytes, elapsed time and number of files by strategy
+        """
+        return {
+            'fixture': self._name,
+            'nodeid': self._request.node.nodeid if self._request is not None else None,
+            'path': str(self),
+            'files': self.io['files'],
+            'bytes': self.io['bytes'],
+            'elapsed': self.io['elapsed'],
+            'strategies': dict(self.strategies),
+        }
+
+    def _add_io_report(self):
+        config = self._request.config
+        report = self.io_report()
+        config.pluginmanager.get_plugin("ngsfixtures-io").add(report)
+        if io_report_path(config) is not None:
+            self._request.node.user_properties.append((IO_REPORT_PROPERTY, report))
+
     def _update_options(self):
         for k in self.keys():
             try:
                 self._d[k] = self._request.getfixturevalue(k)
             except Exception:
                 pass
-        markers = {m.name: m for m in self._request.keywords.get("pytestmark")}
+        markers = {m.name: m for m in self._request.keywords.get("pytestmark", [])}
         if self._name in markers.keys():
             mark = markers[self._name]
             self._d.update(mark.kwargs)
 
+    def _threads(self):
+        if self._d['threads'] is not None:
+            return int(self._d['threads'])
+        if self._request is None:
+            return 1
+        config = self._request.config
+        return int(config.getini("ngs_materialize_threads") or config.getoption("ngs_threads"))
+
+    def _projected_size(self, mode):
+        if mode == 'symlink':
+            return 0
+        files = [str(localpath(str(x))) for x in self._d['data'].values()]
+        return sum(os.path.getsize(x) for x in files if os.path.exists(x))
+
+    def _xdist_store(self):
+        """Check whether to clone from the store shared by xdist workers"""
+        if self._request is None or xdist_worker() is None:
+            return False
+        return self._request.config.getoption("ngs_xdist_store")
+
+    def _setup_sidecars(self):
+        sidecars = SIDECARS if self._d['sidecars'] is True else tuple(self._d['sidecars'])
+        for k in sorted(self._d['data']):
+            if not k.endswith(FASTA_EXTENSIONS):
+                continue
+            fasta = self.join(k).strpath
+            if not os.path.exists(fasta):
+                continue
+            # Opening the FASTA file writes a missing index
+            self._fasta_file(k)
+            write_sidecars(fasta, sidecars=[x for x in sidecars if not x.endswith(".fai")],
+                           processes=self._threads())
+
+    def _setup_subsample(self):
+        from pytest_ngsfixtures.subsample import subsample_cached, SEED
+        params = {'seed': SEED if self._d['seed'] is None else self._d['seed']}
+        if self._d['n_reads'] is not None:
+            params['n_reads'] = int(self._d['n_reads'])
+        else:
+            params['fraction'] = float(self._d['downsample'])
+        data = dict(self._d['data'])
+        groups = {}
+        for k in sorted(data):
+            m = FASTQ_PAIR_RE.match(k)
+            if m is not None:
+                groups.setdefault((m.group(1), m.group(3)), []).append(k)
+            elif k.endswith(FASTQ_EXTENSIONS):
+                groups[(k, None)] = [k]
+        cachedir = fixture_cachedir(self._request, "ngsfixtures-subsample")
+        for keys in groups.values():
+            files = subsample_cached(cachedir, [localpath(data[k]).strpath for k in keys],
+                                     threads=self._threads(), **params)
+            data.update(zip(keys, files))
+        self._d['data'] = data
+
+    def _setup_pool(self):
+        from pytest_ngsfixtures.bgzf import concatenate
+        from pytest_ngsfixtures.store import filelock
+        pools = self._d['pool']
+        if not isinstance(pools, dict):
+            pools = {'pool': list(pools)}
+        data = dict(self._d['data'])
+        reads = {}
+        for k in sorted(data):
+            m = FASTQ_PAIR_RE.match(k)
+            if m is not None:
+                reads.setdefault(m.group(1), []).append((m.group(2), m.group(3), k))
+        cachedir = fixture_cachedir(self._request, "ngsfixtures-pool")
+        for name, members in pools.items():
+            files = {}
+            for member in members:
+                matches = [x for x in reads if member in (x, os.path.basename(x)) or os.path.basename(x).startswith(member + "_")]
+                if not matches:
+                    raise ValueError("pool '{}': no sequence files of sample '{}'".format(name, member))
+                for prefix in matches:
+                    for read, ext, k in reads[prefix]:
+                        files.setdefault((read, ext), []).append(localpath(data[k]).strpath)
+            for (read, ext), inputs in sorted(files.items()):
+                key = [(x, os.stat(x).st_size, os.stat(x).st_mtime_ns) for x in inputs]
+                h = hashlib.blake2b(json.dumps(key).encode(), digest_size=16).hexdigest()
+                dst = "{}_{}{}".format(name, read, ext)
+                path = os.path.join(cachedir, h, dst)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with filelock(path + ".lock"):
+                    if not os.path.exists(path):
+                        concatenate(inputs, path + ".tmp")
+                        os.rename(path + ".tmp", path)
+                data[dst] = path
+        self._d['data'] = data
+
+    def _setup_simulate(self):
+        from pytest_ngsfixtures.simulate import simulate_cached
+        params = self._d['simulate'] if isinstance(self._d['simulate'], dict) else {}
+        files = simulate_cached(fixture_cachedir(self._request, "ngsfixtures-simulate"), **params)
+        self._d['data'] = {os.path.basename(x): x for x in files}
+
+    def _setup_scale(self):
+        table = fanout(ngsconfig.sampleinfo, int(self._d['scale']))
+        selection = self._d['selection'] or {}
+        template = self._d['layout_template'] or SCALE_LAYOUT_TEMPLATE
+        self._d['data'] = layout_from_template(template, table=table, **selection)
+        render = compile_template(template).render
+        rows = table.where(**selection) if selection else table
+        self.sampletable = SampleTable(x._replace(fastq=render(x)) for x in rows)
+        if self._d['mode'] is None:
+            self._d['mode'] = 'symlink'
+
     def _setup_fixture_data(self):
         self._d['dirname'] = os.path.join(str(self._d['testunit']), self._d['dirname'])
         if self._request is not None:
             tmpdir_factory = self._request.getfixturevalue("tmpdir_factory")
+        elif self._tmpdir_factory is not None:
+            tmpdir_factory = self._tmpdir_factory
         else:
             tmpdir_factory = pytest.tmpdir_factory
+        mode = self._d['mode']
+        if mode is None and self._d['copy'] and self._xdist_store():
+            mode = 'store'
+        if mode is None:
+            mode = 'copy' if self._d['copy'] else 'symlink'
         if self._path is not None:
             p = self._path
         else:
-            p = safe_mktemp(tmpdir_factory, **dict(self))
+            options = fixture_root(self._request, self._d['tmpfs'])
+            if options:
+                options['size'] = self._projected_size(mode)
+            p = safe_mktemp(tmpdir_factory, **dict(self), **options)
         self.strpath = str(p)
-        f = safe_copy if self._d['copy'] else safe_symlink
-        for dst, src in self._d['data'].items():
-            f(self, src, dst, ignore_errors=self._d['ignore_errors'])
+        self._options = {
+            'mode': mode,
+            'ignore_errors': self._d['ignore_errors'],
+            'incremental': self._d['incremental'],
+            'store': get_store(tmpdir_factory) if mode in STORE_MODES else None,
+            'threads': self._threads(),
+        }
+        if self._d['lazy']:
+            self.ensure(dir=True)
+            self._pending = {os.path.normpath(str(k)): v for k, v in self._d['data'].items()}
+            return
+        self._materialize(self._d['data'])
 
 
 @pytest.fixture
@@ -153,17 +797,56 @@ def samples(request, tmpdir_factory):
           def test_samples(samples, layout):
               print(samples.listdir())
 
+          @pytest.mark.samples(layout_template="{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz",
+                               selection={'pop': 'PUR', 'is_pool': False})
+          def test_samples_template(samples):
+              print(samples.listdir())
+
     """
     return Fixture('samples', request, datakey="layout", layout=layout['flat'])
 
 
+@pytest.fixture
+def simulate_fastq(request):
+    """Return a function that simulates paired-end reads.
+
+    The function takes the simulation parameters of
+    :py:func:`pytest_ngsfixtures.simulate.simulate` and returns the
+    file names of the first and second reads. Output is cached by
+    parameters in the pytest cache directory.
+
+    Examples:
+
+       .. code-block:: python
+
+          def test_throughput(simulate_fastq):
+              r1, r2 = simulate_fastq(reads=100000, read_length=150, seed=1)
+
+       .. code-block:: python
+
+          @pytest.mark.samples(simulate={'reads': 1000000})
+          def test_samples(samples):
+              print(samples.listdir())
+    """
+    from pytest_ngsfixtures.simulate import simulate_cached
+    cachedir = fixture_cachedir(request, "ngsfixtures-simulate")
+
+    def _simulate(**kwargs):
+        return simulate_cached(cachedir, **kwargs)
+
+    return _simulate
+
+
 @pytest.fixture
 def ref(request, tmpdir_factory):
     """Return a temporary directory path object pointing to the location
     of reference files.
 
     The reference directory path name can be changed with
-    @pytest.mark.ref(dirname="refdirname")
+    @pytest.mark.ref(dirname="refdirname"). The reference files can be
+    restricted to bundles, such as fasta, annotation or variants, or
+    single files with the bundles option; sidecar files are added
+    automatically.
 
     Examples:
 
@@ -172,5 +855,9 @@ def ref(request, tmpdir_factory):
           @pytest.mark.ref(dirname="foo", data={'ref.fa': '/path/to/ref.fa'})
           def test_ref(ref):
               print(ref)
+
+          @pytest.mark.ref(bundles=["scaffolds.fa", "variants"])
+          def test_ref_bundles(ref):
+              print(ref.listdir())
     """
-    return Fixture('ref', request, datakey="reflayout", ignore_errors=True, reflayout=reflayout)
+    return Fixture('ref', request, datakey="reflayout", ignore_errors=True, reflayout=dict(ngsconfig.reflayout))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Compressed reference storage and decompression cache.
+
+The large reference FASTA files are shipped compressed:
+``scaffolds.fa`` is stored as BGZF (``scaffolds.fa.gz``) and
+``scaffoldsN.fa`` as an N-mask over ``scaffolds.fa``, namely the
+intervals of ``scaffoldsN.bed``. :py:data:`REFERENCES` lists how each
+reference is derived.
+
+References are decompressed once per machine, on first use, into a
+versioned directory of the user cache (see :py:func:`cache_dir`), and
+fixtures are setup from there. The cache directory name covers the
+digests of the source files, so that a new package version with
+changed reference data gets a new cache directory. Cached files are
+written under a file lock and moved into place with an atomic rename,
+so that concurrent pytest processes decompress each file once.
+
+The cache root is, in order of precedence, the environment variable
+``NGSFIXTURES_CACHE_DIR``, ``$XDG_CACHE_HOME/pytest-ngsfixtures`` or
+``~/.cache/pytest-ngsfixtures``.
+
+Examples:
+
+   .. code-block:: python
+
+      path = reference("scaffoldsN.fa")
+"""
+import os
+import gzip
+import shutil
+import hashlib
+import logging
+from pytest_ngsfixtures.config import REF_DIR
+
+logger = logging.getLogger(__name__)
+
+# Cache format version; bump to invalidate existing caches
+VERSION = 1
+
+# Reference file name -> (source, mask). The source is a compressed
+# file in the reference directory or another reference; the mask is a
+# BED file of intervals set to N, or None.
+REFERENCES = {
+    'scaffolds.fa': ('scaffolds.fa.gz', None),
+    'scaffoldsN.fa': ('scaffolds.fa', 'scaffoldsN.bed'),
+}
+
+_BUFSIZE = 1024 * 1024
+
+
+def sources():
+    """List the files in the reference directory that references are
+    derived from.
+
+    Returns:
+      list: file names relative to the reference directory
+    """
+    files = set()
+    for source, mask in REFERENCES.values():
+        if source not in REFERENCES:
+            files.add(source)
+        if mask is not None:
+            files.add(mask)
+    return sorted(files)
+
+
+def cache_root():
+    """Get the root of the user cache.
+
+    Returns:
+      str: cache root directory
+    """
+    root = os.environ.get("NGSFIXTURES_CACHE_DIR")
+    if not root:
+        xdg = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(xdg, "pytest-ngsfixtures")
+    return root
+
+
+def _source_digests():
+    """Get the source file digests from the manifest, hashing files
+    that are not listed"""
+    from pytest_ngsfixtures.manifest import read_manifest
+    from pytest_ngsfixtures.store import digest
+    try:
+        manifest = read_manifest()
+    except OSError:
+        manifest = {}
+    digests = []
+    for name in sources():
+        entry = manifest.get(os.path.join("ref", name))
+        digests.append((name, entry[1] if entry else digest(REF_DIR / name)))
+    return digests
+
+
+def cache_dir():
+    """Get the versioned reference cache directory.
+
+    Returns:
+      str: cache directory; not created
+    """
+    if "_cache_dir" not in globals():
+        h = hashlib.blake2b(digest_size=8)
+        h.update(str(VERSION).encode())
+        for name, d in _source_digests():
+            h.update("\t{}\t{}".format(name, d).encode())
+        globals()["_cache_dir"] = os.path.join(cache_root(), "ref-{}".format(h.hexdigest()))
+    return globals()["_cache_dir"]
+
+
+def read_bed(path):
+    """Read the intervals of a BED file.
+
+    Args:
+      path (str): BED file name
+
+    Returns:
+      list: (name, start, end) tuples
+    """
+    intervals = []
+    with open(str(path)) as fh:
+        for line in fh:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            name, start, end = line.split("\t")[:3]
+            intervals.append((name, int(start), int(end)))
+    return intervals
+
+
+def mask(data, index, intervals):
+    """Set intervals of a FASTA file to N.
+
+    Args:
+      data (bytearray): FASTA file content, modified in place
+      index (dict): FaiEntry index entries by sequence name
+      intervals (list): (name, start, end) tuples of 0-based half
+                        open intervals
+    """
+    for name, start, end in intervals:
+        entry = index[name]
+        end = min(end, entry.length)
+        while start < end:
+            stop = min(end, (start // entry.linebases + 1) * entry.linebases)
+            offset = entry.offset + start // entry.linebases * entry.linewidth + start % entry.linebases
+            data[offset:offset + stop - start] = b"N" * (stop - start)
+            start = stop
+
+
+def _decompress(src, dst):
+    with gzip.open(str(src), "rb") as fin, open(dst, "wb") as fout:
+        shutil.copyfileobj(fin, fout, _BUFSIZE)
+
+
+def _mask(src, bed, dst):
+    from pytest_ngsfixtures.faidx import build_fai
+    index = build_fai(src)
+    with open(src, "rb") as fh:
+        data = bytearray(fh.read())
+    mask(data, index, read_bed(bed))
+    with open(dst, "wb") as fh:
+        fh.write(data)
+
+
+def reference(name):
+    """Get the path of a reference, decompressing it on first use.
+
+    Args:
+      name (str): reference file name; see :py:data:`REFERENCES`
+
+    Returns:
+      str: path to the reference in the cache directory
+    """
+    from pytest_ngsfixtures.store import filelock
+    try:
+        source, bed = REFERENCES[name]
+    except KeyError:
+        raise ValueError("no such compressed reference: '{}'; references are {}".format(
+            name, ", ".join(sorted(REFERENCES))))
+    path = os.path.join(cache_dir(), name)
+    if os.path.exists(path):
+        return path
+    if source in REFERENCES:
+        source = reference(source)
+    else:
+        source = str(REF_DIR / source)
+    os.makedirs(cache_dir(), exist_ok=True)
+    with filelock(path + ".lock"):
+        if os.path.exists(path):
+            return path
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            if bed is None:
+                _decompress(source, tmp)
+            else:
+                _mask(source, str(REF_DIR / bed), tmp)
+            os.rename(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+    logger.debug("decompressed reference {} to {}".format(name, path))
+    return path
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Indexed sample table.
+
+A :py:class:`SampleTable` holds one :py:class:`Sample` record per
+sequence file. Records are tuples with named fields, so they can be
+unpacked positionally like the rows of the former sampleinfo list.
+Indexes by the fields in :py:data:`INDEXED` are built on first query
+and kept up to date as rows are added.
+
+Examples:
+
+   .. code-block:: python
+
+      table = SampleTable.from_file("samplesheet.tsv")
+      for s in table.where(pop="PUR", is_pool=False):
+          print(s.sample, s.fastq)
+"""
+import sys
+import csv
+import logging
+import functools
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Sample table columns, in order
+FIELDS = ('sample', 'pu', 'pop', 'batch', 'fastq', 'read', 'run', 'is_pool')
+
+# Columns that are indexed for queries
+INDEXED = ('sample', 'pu', 'pop', 'batch', 'run', 'is_pool')
+
+# Required columns of sample sheets
+REQUIRED = ('sample', 'fastq')
+
+_TRUE = {'true', 't', 'yes', 'y', '1'}
+
+
+class Sample(namedtuple("Sample", FIELDS)):
+    """Sample record.
+
+    Args:
+      sample (str): sample name
+      pu (str): platform unit
+      pop (str): population
+      batch (str): batch or project
+      fastq (str): sequence file name
+      read (str): read number
+      run (str): run name
+      is_pool (bool): sample is a pool of samples
+    """
+    __slots__ = ()
+
+
+def _coerce(row):
+    """Convert a sequence or mapping to a Sample, interning strings"""
+    if isinstance(row, Sample):
+        return row
+    if isinstance(row, dict):
+        missing = [x for x in REQUIRED if not row.get(x)]
+        if missing:
+            raise ValueError("sample sheet row {} lacks required columns {}".format(row, ", ".join(missing)))
+        row = [row.get(x) for x in FIELDS]
+        if not row[6]:
+            row[6] = row[0]
+    values = [sys.intern(str(x)) if x is not None else '' for x in row[:7]]
+    is_pool = row[7] if len(row) > 7 else False
+    if isinstance(is_pool, str):
+        is_pool = is_pool.strip().lower() in _TRUE
+    return Sample(*values, is_pool=bool(is_pool))
+
+
+class SampleTable:
+    """Table of sample records with indexes and a query API.
+
+    Args:
+      rows (iterable): Sample records, sequences of values in
+                       :py:data:`FIELDS` order, or mappings of field
+                       names to values
+    """
+    def __init__(self, rows=()):
+        self._rows = []
+        self._indexes = {}
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def __repr__(self):
+        return "SampleTable({} rows)".format(len(self))
+
+    def append(self, row):
+        """Add a row to the table.
+
+        Args:
+          row (Sample, sequence, dict): sample record
+        """
+        row = _coerce(row)
+        i = len(self._rows)
+        self._rows.append(row)
+        for field, index in self._indexes.items():
+            index.setdefault(getattr(row, field), []).append(i)
+
+    def extend(self, rows):
+        """Add rows to the table.
+
+        Args:
+          rows (iterable): sample records; consumed one at a time
+        """
+        if not self._indexes:
+            self._rows.extend(map(_coerce, rows))
+            return
+        for row in rows:
+            self.append(row)
+
+    def index(self, field):
+        """Get the index of a field.
+
+        Args:
+          field (str): field name
+
+        Returns:
+          dict: mapping of field values to row numbers
+        """
+        if field not in self._indexes:
+            index = {}
+            for i, row in enumerate(self._rows):
+                index.setdefault(getattr(row, field), []).append(i)
+            self._indexes[field] = index
+        return self._indexes[field]
+
+    def values(self, field):
+        """Get the unique values of a field, in order of appearance.
+
+        Args:
+          field (str): field name
+
+        Returns:
+          list: unique field values
+        """
+        return list(self.index(field))
+
+    def where(self, **kwargs):
+        """Select rows by field values.
+
+        Examples:
+
+           .. code-block:: python
+
+              sampleinfo.where(pop="PUR", is_pool=False)
+              sampleinfo.where(run=["CHS.HG00512", "CHS.HG00513"])
+
+        Args:
+          kwargs: field names and values. A list, tuple or set value
+                  matches any of its elements
+
+        Returns:
+          SampleTable: the matching rows
+        """
+        unknown = set(kwargs) - set(FIELDS)
+        if unknown:
+            raise ValueError("no such sample table fields: {}; fields are {}".format(
+                ", ".join(sorted(unknown)), ", ".join(FIELDS)))
+        selected = None
+        filters = {}
+        for field, value in kwargs.items():
+            values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            if field not in INDEXED:
+                filters[field] = set(values)
+                continue
+            index = self.index(field)
+            rows = set()
+            for v in values:
+                rows.update(index.get(v, ()))
+            selected = rows if selected is None else selected & rows
+        if selected is None:
+            selected = range(len(self._rows))
+        rows = (self._rows[i] for i in sorted(selected))
+        return SampleTable(x for x in rows
+                           if all(getattr(x, k) in v for k, v in filters.items()))
+
+    @classmethod
+    def from_file(cls, path, sep=None):
+        """Load a sample table from a sample sheet.
+
+        The sample sheet must have a header with column names in
+        :py:data:`FIELDS`; the columns sample and fastq are required.
+        Rows are read one at a time, so large sample sheets are not
+        held in memory twice. A missing run defaults to the sample
+        name.
+
+        Args:
+          path (str): sample sheet file name
+          sep (str): column separator; defaults to ',' for files
+                     ending in .csv and tab otherwise
+
+        Returns:
+          SampleTable: the sample table
+        """
+        path = str(path)
+        if sep is None:
+            sep = "," if path.endswith(".csv") else "\t"
+        with open(path, newline="") as fh:
+            reader = csv.reader(fh, delimiter=sep)
+            header = next(reader, [])
+            missing = [x for x in REQUIRED if x not in header]
+            if missing:
+                raise ValueError("sample sheet {} lacks required columns {}".format(path, ", ".join(missing)))
+            columns = [header.index(x) if x in header else None for x in FIELDS]
+            if columns[6] is None:
+                columns[6] = columns[0]
+            return cls(Sample(*[sys.intern(row[i]) if i is not None else '' for i in columns[:7]],
+                              is_pool=columns[7] is not None and row[columns[7]].strip().lower() in _TRUE)
+                       for row in reader if row)
+
+    def to_file(self, path, sep=None):
+        """Write the sample table as a sample sheet.
+
+        Args:
+          path (str): sample sheet file name
+          sep (str): column separator; defaults to ',' for files
+                     ending in .csv and tab otherwise
+        """
+        path = str(path)
+        if sep is None:
+            sep = "," if path.endswith(".csv") else "\t"
+        with open(path, "w", newline="") as fh:
+            writer = csv.writer(fh, delimiter=sep, lineterminator="\n")
+            writer.writerow(FIELDS)
+            writer.writerows(self._rows)
+
+
+@functools.lru_cache(maxsize=8)
+def _fanout(rows, n, batch_size, lanes):
+    """Memoized virtual sample records by table rows and arguments"""
+    table = SampleTable(rows)
+    runs = [table.where(run=r, is_pool=False) for r in table.values("run")]
+    runs = [x for x in runs if len(x) > 0]
+    if not runs:
+        raise ValueError("sample table has no runs to fan out")
+    width = len(str(max(n - 1, 0)))
+
+    def _rows():
+        for i in range(n):
+            base = runs[i % len(runs)]
+            sample = "{}.SYN{:0{}d}".format(base[0].pop, i, width)
+            pu = "SYN{:05d}XX.{}".format(i // lanes // lanes, i // lanes % lanes + 1)
+            batch = "p{}".format(i // batch_size + 1)
+            for x in base:
+                yield Sample(sample, pu, x.pop, batch, x.fastq, x.read, sample, False)
+
+    return tuple(_rows())
+
+
+def fanout(table, n, batch_size=96, lanes=8):
+    """Generate a sample table of n virtual samples.
+
+    Virtual samples reuse the sequence files of the runs of table that
+    are not pools, in order, and are spread over the populations of
+    those runs, over batches of batch_size samples and over the lanes
+    of flowcells. Names are deterministic: sample i of population POP
+    is named POP.SYNi, with i zero-padded to the width of n - 1.
+
+    Sample records are cached by table content and arguments; every
+    call returns a new table that the caller may modify.
+
+    Args:
+      table (SampleTable): sample table whose sequence files are reused
+      n (int): number of virtual samples
+      batch_size (int): number of samples per batch
+      lanes (int): number of lanes per flowcell
+
+    Returns:
+      SampleTable: virtual samples, one row per sequence file
+    """
+    return SampleTable(_fanout(tuple(table), n, batch_size, lanes))
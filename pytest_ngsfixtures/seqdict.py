@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Sequence dictionary, interval list and chromosome sizes.
+
+Generates the reference sidecar files otherwise made with Picard
+CreateSequenceDictionary and friends:
+
+- a sequence dictionary (``.dict``) with per-contig MD5 checksums
+- an interval list (``.interval_list``) of whole contigs
+- chromosome sizes (``.chrom.sizes``)
+
+Contig lengths and byte offsets are taken from the FASTA index (see
+:py:mod:`pytest_ngsfixtures.faidx`). Contig MD5 checksums are computed
+in a process pool, where each worker reads only the bytes of its
+contigs.
+
+Examples:
+
+   .. code-block:: python
+
+      write_sidecars("ref.fa")
+"""
+import os
+import sys
+import mmap
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pytest_ngsfixtures.faidx import FastaFile, FASTA_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Sidecar file suffixes, relative to the FASTA file name stem
+SIDECARS = ('.dict', '.interval_list', '.chrom.sizes')
+
+# Total sequence length below which checksums are computed serially
+PARALLEL_MIN_LENGTH = 4 * 1024 * 1024
+
+_DELETE = b" \t\r\n"
+
+
+def _span(entry):
+    """Byte length of the sequence lines of an index entry"""
+    if entry.length == 0:
+        return 0
+    lines = (entry.length - 1) // entry.linebases
+    return lines * entry.linewidth + entry.length - lines * entry.linebases
+
+
+def contig_md5(path, offset, size):
+    """Compute the MD5 checksum of a contig.
+
+    As in the SAM specification, the checksum is computed over the
+    upper case sequence without whitespace.
+
+    Args:
+      path (str): FASTA file name
+      offset (int): byte offset of the first base
+      size (int): byte length of the sequence lines
+
+    Returns:
+      str: hexadecimal MD5 digest
+    """
+    if size == 0:
+        return hashlib.md5().hexdigest()
+    with open(path, "rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            seq = mm[offset:offset + size]
+    return hashlib.md5(seq.translate(None, _DELETE).upper()).hexdigest()
+
+
+def sequence_dictionary(path, processes=None):
+    """Compute the sequence dictionary of a FASTA file.
+
+    Args:
+      path (str): FASTA file name
+      processes (int): number of processes used to compute checksums;
+                       defaults to the number of CPUs
+
+    Returns:
+      list: (name, length, md5) tuples, in file order
+    """
+    path = str(path)
+    with FastaFile(path) as fa:
+        entries = list(fa.index.values())
+    processes = processes or os.cpu_count() or 1
+    args = [(path, x.offset, _span(x)) for x in entries]
+    if processes <= 1 or len(entries) <= 1 or sum(x.length for x in entries) < PARALLEL_MIN_LENGTH:
+        checksums = [contig_md5(*x) for x in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(entries))) as executor:
+            checksums = list(executor.map(contig_md5, *zip(*args)))
+    return [(x.name, x.length, md5) for x, md5 in zip(entries, checksums)]
+
+
+def _header(seqdict, uri):
+    lines = ["@HD\tVN:1.5\tSO:unsorted\n"]
+    for name, length, md5 in seqdict:
+        lines.append("@SQ\tSN:{}\tLN:{}\tM5:{}\tUR:{}\n".format(name, length, md5, uri))
+    return "".join(lines)
+
+
+def write_dict(seqdict, path, uri):
+    """Write a sequence dictionary.
+
+    Args:
+      seqdict (list): (name, length, md5) tuples
+      path (str): output file name
+      uri (str): URI of the FASTA file
+    """
+    with open(str(path), "w") as fh:
+        fh.write(_header(seqdict, uri))
+
+
+def write_interval_list(seqdict, path, uri):
+    """Write an interval list of whole contigs.
+
+    Args:
+      seqdict (list): (name, length, md5) tuples
+      path (str): output file name
+      uri (str): URI of the FASTA file
+    """
+    with open(str(path), "w") as fh:
+        fh.write(_header(seqdict, uri))
+        for name, length, _ in seqdict:
+            fh.write("{}\t1\t{}\t+\t.\n".format(name, length))
+
+
+def write_chrom_sizes(seqdict, path):
+    """Write chromosome sizes.
+
+    Args:
+      seqdict (list): (name, length, md5) tuples
+      path (str): output file name
+    """
+    with open(str(path), "w") as fh:
+        for name, length, _ in seqdict:
+            fh.write("{}\t{}\n".format(name, length))
+
+
+def sidecar_stem(path):
+    """Strip the FASTA extension from a file name.
+
+    Args:
+      path (str): FASTA file name
+
+    Returns:
+      str: file name without extension
+    """
+    for ext in FASTA_EXTENSIONS:
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return os.path.splitext(path)[0]
+
+
+def write_sidecars(path, sidecars=SIDECARS, processes=None, overwrite=False):
+    """Write the sidecar files of a FASTA file.
+
+    The FASTA index is written as a side effect if missing. Sidecar
+    files are written next to the FASTA file, e.g. ref.dict for
+    ref.fa.
+
+    Args:
+      path (str): FASTA file name
+      sidecars (tuple): sidecar suffixes to write; see :py:data:`SIDECARS`
+      processes (int): number of processes used to compute checksums
+      overwrite (bool): overwrite existing sidecar files
+
+    Returns:
+      list: file names of the written sidecar files
+    """
+    path = str(path)
+    stem = sidecar_stem(path)
+    todo = [x for x in sidecars if overwrite or not os.path.exists(stem + x)]
+    if not todo:
+        return []
+    seqdict = sequence_dictionary(path, processes=processes)
+    uri = "file:" + os.path.abspath(path)
+    writers = {
+        '.dict': lambda out: write_dict(seqdict, out, uri),
+        '.interval_list': lambda out: write_interval_list(seqdict, out, uri),
+        '.chrom.sizes': lambda out: write_chrom_sizes(seqdict, out),
+    }
+    outputs = []
+    for suffix in todo:
+        if suffix not in writers:
+            raise ValueError("unknown sidecar '{}'; sidecars are {}".format(suffix, ", ".join(SIDECARS)))
+        writers[suffix](stem + suffix)
+        outputs.append(stem + suffix)
+    logger.debug("wrote sidecars {}".format(", ".join(outputs)))
+    return outputs
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if len(args) < 2 or args[0] not in SIDECARS:
+        print("usage: python -m pytest_ngsfixtures.seqdict {{{}}} FASTA [FASTA ...]".format(
+            ",".join(SIDECARS)), file=sys.stderr)
+        return 1
+    for path in args[1:]:
+        write_sidecars(path, sidecars=(args[0],), overwrite=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Synthetic paired-end FASTQ generator.
+
+Read pairs are sampled from the sequences of a reference FASTA file
+with a normally distributed insert size. Reads carry substitution and
+indel errors and position-dependent quality strings. All reads of a
+batch are generated with NumPy array operations; the output of a
+given set of parameters is deterministic by seed.
+
+Simulated files are cached on disk by the hash of the parameters and
+the reference content, see :py:func:`simulate_cached`.
+
+NumPy is an optional dependency; install with ``pip install
+pytest-ngsfixtures[simulate]``.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+from pytest_ngsfixtures.os import localpath
+from pytest_ngsfixtures.config import REF_DIR
+from pytest_ngsfixtures.bgzf import BgzfWriter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Simulator version; bump to invalidate cached output on changes
+# that affect the generated reads
+VERSION = 1
+
+# Default simulation parameters
+DEFAULTS = {
+    'reads': 10000,
+    'read_length': 100,
+    'insert_mean': 300,
+    'insert_sd': 30,
+    'substitution_rate': 0.005,
+    'indel_rate': 0.0005,
+    'quality_mean': 37,
+    'quality_decay': 0.1,
+    'quality_sd': 3,
+    'seed': 0,
+    'ref': 'scaffolds.fa',
+    'sample': 'sim',
+}
+
+# Number of read pairs generated per batch
+BATCH_SIZE = 50000
+
+if np is not None:
+    _BASES = np.frombuffer(b"ACGTN", dtype=np.uint8)
+    _COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("simulating reads requires numpy; install with 'pip install pytest-ngsfixtures[simulate]'")
+
+
+def _resolve_ref(ref):
+    if os.path.isabs(str(ref)) or os.path.exists(str(ref)):
+        return str(ref)
+    return str(localpath(str(REF_DIR / ref)))
+
+
+def read_fasta(path):
+    """Read a FASTA file as base codes.
+
+    Args:
+      path (str): FASTA file name
+
+    Returns:
+      tuple: array of base codes (A=0, C=1, G=2, T=3, other=4) of the
+      concatenated sequences and array of sequence start offsets, the
+      last of which is the total length
+    """
+    _require_numpy()
+    lookup = np.full(256, 4, dtype=np.uint8)
+    for i, b in enumerate(b"ACGT"):
+        lookup[b] = i
+        lookup[ord(chr(b).lower())] = i
+    seqs = []
+    with open(path, "rb") as fh:
+        for record in fh.read().split(b">")[1:]:
+            seq = b"".join(record.split(b"\n")[1:]).replace(b"\r", b"")
+            seqs.append(lookup[np.frombuffer(seq, dtype=np.uint8)])
+    offsets = np.cumsum([0] + [len(x) for x in seqs])
+    return np.concatenate(seqs), offsets
+
+
+def _mutate(rng, seq, starts, bounds, direction, params):
+    """Sample reads with indel and substitution errors.
+
+    Read i starts at starts[i] and walks through seq in direction,
+    never leaving the sequence interval given by bounds. Errors are
+    sparse, so error positions are drawn directly rather than by
+    testing every base.
+    """
+    n, length = len(starts), params['read_length']
+    size = n * length
+    k = rng.binomial(size, params['indel_rate'])
+    indels = rng.integers(0, size, k)
+    insertion = rng.random(k) < 0.5
+    pos = starts[:, None] + direction * np.arange(length)
+    if k > 0:
+        # Shift the positions of reads with indels; an insertion does
+        # not consume a reference base, a deletion skips one
+        rows = np.unique(indels // length)
+        delta = np.zeros((len(rows), length), dtype=np.int64)
+        np.add.at(delta, (np.searchsorted(rows, indels // length), indels % length), np.where(insertion, -1, 1))
+        pos[rows] += direction * np.cumsum(delta, axis=1)
+        pos[rows] = np.clip(pos[rows], bounds[0][rows, None], bounds[1][rows, None] - 1)
+    codes = seq[pos]
+    if direction < 0:
+        codes = _COMPLEMENT[codes]
+    flat = codes.reshape(-1)
+    flat[indels[insertion]] = rng.integers(0, 4, size=int(insertion.sum()), dtype=np.uint8)
+    substitutions = rng.integers(0, size, rng.binomial(size, params['substitution_rate']))
+    flat[substitutions] = (flat[substitutions] + rng.integers(1, 4, size=len(substitutions), dtype=np.uint8)) % 4
+    qual = rng.standard_normal((n, length), dtype=np.float32)
+    qual *= params['quality_sd']
+    qual += params['quality_mean'] - params['quality_decay'] * np.arange(length, dtype=np.float32)
+    qual = qual.reshape(-1)
+    qual[substitutions] -= 15
+    qual[indels[insertion]] -= 15
+    np.rint(qual, out=qual)
+    np.clip(qual, 2, 41, out=qual)
+    qual = qual.astype(np.uint8)
+    qual += 33
+    return _BASES[codes], qual.reshape(n, length)
+
+
+def _records(names, seqs, quals, mate):
+    """Format FASTQ records of equal length as a single bytes object"""
+    n = len(names)
+    header = np.concatenate([np.full((n, 1), ord("@"), dtype=np.uint8), names,
+                             np.frombuffer("/{}\n".format(mate).encode(), dtype=np.uint8)[None, :].repeat(n, 0)], axis=1)
+    newline = np.full((n, 1), ord("\n"), dtype=np.uint8)
+    plus = np.frombuffer(b"\n+\n", dtype=np.uint8)[None, :].repeat(n, 0)
+    return np.concatenate([header, seqs, plus, quals, newline], axis=1).tobytes()
+
+
+def simulate(outdir, threads=None, **kwargs):
+    """Simulate paired-end reads.
+
+    Output is written as BGZF, compressed with threads threads.
+
+    Args:
+      outdir (str): output directory
+      threads (int): number of compression threads
+      kwargs: simulation parameters; see :py:data:`DEFAULTS`
+
+    Returns:
+      list: file names of first and second reads,
+      outdir/{sample}_1.fastq.gz and outdir/{sample}_2.fastq.gz
+    """
+    _require_numpy()
+    params = dict(DEFAULTS, **kwargs)
+    seq, offsets = read_fasta(_resolve_ref(params['ref']))
+    lengths = np.diff(offsets)
+    rng = np.random.default_rng(params['seed'])
+    width = len(str(max(params['reads'] - 1, 0)))
+    prefix = np.frombuffer("{}.".format(params['sample']).encode(), dtype=np.uint8)
+    digits = 10 ** np.arange(width - 1, -1, -1)
+    outputs = [os.path.join(str(outdir), "{}_{}.fastq.gz".format(params['sample'], i)) for i in (1, 2)]
+    fh = [BgzfWriter(x, threads=threads, level=1) for x in outputs]
+    try:
+        for first in range(0, params['reads'], BATCH_SIZE):
+            n = min(BATCH_SIZE, params['reads'] - first)
+            contig = rng.choice(len(lengths), size=n, p=lengths / lengths.sum())
+            insert = np.rint(rng.normal(params['insert_mean'], params['insert_sd'], size=n)).astype(np.int64)
+            insert = np.clip(insert, params['read_length'], lengths[contig])
+            start = offsets[contig] + (rng.random(n) * (lengths[contig] - insert + 1)).astype(np.int64)
+            bounds = (offsets[contig], offsets[contig + 1])
+            ids = np.arange(first, first + n)
+            names = np.concatenate([prefix[None, :].repeat(n, 0),
+                                    (ids[:, None] // digits % 10 + ord("0")).astype(np.uint8)], axis=1)
+            r1 = _mutate(rng, seq, start, bounds, 1, params)
+            r2 = _mutate(rng, seq, start + insert - 1, bounds, -1, params)
+            fh[0].write(_records(names, *r1, mate=1))
+            fh[1].write(_records(names, *r2, mate=2))
+    finally:
+        for x in fh:
+            x.close()
+    return outputs
+
+
+def parameter_hash(**kwargs):
+    """Hash simulation parameters, reference content and simulator version.
+
+    Returns:
+      str: hexadecimal digest
+    """
+    from pytest_ngsfixtures.store import digest
+    params = dict(DEFAULTS, **kwargs)
+    params['ref'] = digest(_resolve_ref(params['ref']))
+    params['version'] = VERSION
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def simulate_cached(cachedir, **kwargs):
+    """Simulate paired-end reads, reusing cached output.
+
+    Output is stored in cachedir/{hash}, where hash is the
+    :py:func:`parameter_hash` of the parameters. Output is written to
+    a temporary directory, which is renamed into place under a file
+    lock, so concurrent processes simulate each parameter set once.
+
+    Args:
+      cachedir (str): cache directory
+      kwargs: simulation parameters; see :py:data:`DEFAULTS`
+
+    Returns:
+      list: file names of first and second reads
+    """
+    from pytest_ngsfixtures.store import filelock
+    params = dict(DEFAULTS, **kwargs)
+    path = os.path.join(str(cachedir), parameter_hash(**params))
+    outputs = [os.path.join(path, "{}_{}.fastq.gz".format(params['sample'], i)) for i in (1, 2)]
+    os.makedirs(str(cachedir), exist_ok=True)
+    with filelock(path + ".lock"):
+        if os.path.isdir(path):
+            logger.debug("using cached simulation {}".format(path))
+            return outputs
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        simulate(tmp, **params)
+        with open(os.path.join(tmp, "params.json"), "w") as fh:
+            json.dump(params, fh, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+    return outputs
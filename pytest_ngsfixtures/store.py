@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Session-wide content-addressed fixture store.
+
+Source files are written to the store once per session, keyed by the
+hash of their content. Fixture files are then setup as reflink clones
+of the store entries where the filesystem supports it; elsewhere the
+store is skipped and source files are copied directly, see
+:py:meth:`FixtureStore.clone`.
+
+The store also holds the files that the hardlink and auto modes link
+to (see :py:meth:`FixtureStore.link`), so that fixture files are
+never hard links to the source data.
+
+Under pytest-xdist, the store is shared by all workers of a session.
+Entries are written under an exclusive file lock and moved into place
+with an atomic rename, so that each file is stored exactly once.
+"""
+import os
+import py
+import stat
+import errno
+import hashlib
+import logging
+import threading
+import contextlib
+from pytest_ngsfixtures.os import copy_engine, fcntl
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = "ngsfixtures-store"
+
+_BUFSIZE = 1024 * 1024
+
+# Stores created in this session, by path
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def digest(path):
+    """Compute content hash of a file.
+
+    Args:
+      path (str): file name
+
+    Returns:
+      str: hexadecimal BLAKE2b digest
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(str(path), "rb") as fh:
+        for chunk in iter(lambda: fh.read(_BUFSIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def filelock(path):
+    """Hold an exclusive lock on a lock file, shared across processes.
+
+    Args:
+      path (str): lock file name; created if missing
+    """
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def xdist_worker():
+    """Return the pytest-xdist worker id, or None if not running in a worker"""
+    return os.environ.get("PYTEST_XDIST_WORKER")
+
+
+def unshare(path):
+    """Replace a hard linked fixture file with a private, writable copy.
+
+    Fixture files setup with mode hardlink or auto may be read-only
+    hard links to a store entry shared with other fixtures (see
+    :py:meth:`FixtureStore.link`); call unshare before writing to
+    such a file.
+
+    Args:
+      path (str, LocalPath): fixture file
+
+    Returns:
+      path (LocalPath): the fixture file
+    """
+    path = py.path.local(path)
+    if os.stat(str(path)).st_nlink > 1:
+        tmp = path.new(basename=".{}.unshare".format(path.basename))
+        copy_engine.copy(path, tmp)
+        os.replace(str(tmp), str(path))
+    os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IWUSR)
+    return path
+
+
+class FixtureStore:
+    """Content-addressed store of fixture files.
+
+    Args:
+      path (str, LocalPath): store root directory
+
+    Attributes:
+      dev (int): device of the store
+      hits (int): number of clones whose content was already stored
+      misses (int): number of clones whose content had to be stored
+    """
+    def __init__(self, path):
+        self.path = py.path.local(path)
+        os.makedirs(str(self.path), exist_ok=True)
+        self.dev = os.stat(str(self.path)).st_dev
+        self.hits = 0
+        self.misses = 0
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "FixtureStore('{}', hits={}, misses={})".format(self.path, self.hits, self.misses)
+
+    def add(self, src):
+        """Add a file to the store.
+
+        The content hash of a source file is cached by path, size,
+        inode and modification time, so unchanged files are hashed
+        only once.
+
+        Args:
+          src (str, LocalPath): source file name
+
+        Returns:
+          entry (LocalPath): store entry with the content of src
+        """
+        st = os.stat(str(src))
+        key = (os.path.realpath(str(src)), st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+        h = digest(src)
+        entry = self.path.join(h[:2], h)
+        os.makedirs(str(entry.dirpath()), exist_ok=True)
+        with filelock(str(entry) + ".lock"):
+            if entry.check(file=1):
+                with self._lock:
+                    self.hits += 1
+            else:
+                tmp = entry.new(basename="{}.{}.{}.tmp".format(h, os.getpid(), threading.get_ident()))
+                copy_engine.copy(src, tmp)
+                os.chmod(str(tmp), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(str(tmp), str(entry))
+                with self._lock:
+                    self.misses += 1
+        with self._lock:
+            self._index[key] = entry
+        return entry
+
+    def clone(self, src, dst, dir_fd=None):
+        """Setup dst as a clone of src via the store.
+
+        The clone is a reflink of the store entry, so that dst shares
+        the data blocks of the entry until it is written to, and never
+        its inode. Once the copy engine has found that the store and
+        dst filesystems do not support reflinks, src is copied
+        directly to dst, skipping the store, as storing would only add
+        a hash and a second copy; the strategy returned is then that
+        of the copy, e.g. copy_file_range.
+
+        Args:
+          src (LocalPath): source file name
+          dst (LocalPath): destination file name
+          dir_fd (int): directory descriptor dst is relative to
+
+        Returns:
+          strategy (str): name of the strategy used
+        """
+        if dir_fd is None:
+            if dst.exists():
+                raise py.error.EEXIST("clone('{src}', '{dst}')".format(src=src, dst=dst))
+            dev = os.stat(str(dst.dirpath())).st_dev
+        else:
+            dev = os.fstat(dir_fd).st_dev
+        if copy_engine.cached(self.dev, dev) not in (None, "reflink"):
+            return copy_engine.copy(src, dst, dir_fd=dir_fd)
+        return copy_engine.copy(self.add(src), dst, dir_fd=dir_fd)
+
+    def link(self, src, dst):
+        """Setup dst as a hard link to the store entry of src.
+
+        Source files are never hard linked, so that writing to dst
+        cannot modify the source data. Store entries are read-only,
+        but the permissions do not protect them from the root user,
+        and writing to dst modifies the entry for all fixtures linked
+        to it; see :py:func:`unshare`. If the store and dst are
+        located on different devices, src is copied.
+
+        Args:
+          src (LocalPath): source file name
+          dst (LocalPath): destination file name
+
+        Returns:
+          strategy (str): name of the strategy used
+        """
+        if dst.exists():
+            raise py.error.EEXIST("link('{src}', '{dst}')".format(src=src, dst=dst))
+        if os.stat(str(dst.dirpath())).st_dev != self.dev:
+            return copy_engine.copy(src, dst)
+        try:
+            os.link(str(self.add(src)), str(dst))
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            return copy_engine.copy(src, dst)
+        return "hardlink"
+
+
+def get_store(tmpdir_factory):
+    """Get the session fixture store.
+
+    The store is located in the directory
+    :py:data:`STORE_DIRNAME` of the pytest basetemp directory. In a
+    pytest-xdist worker, the store is located in the session basetemp
+    directory shared by all workers, i.e. the parent of the worker
+    basetemp directory, which pytest-xdist names popen-<worker id>.
+
+    Args:
+      tmpdir_factory (TempdirFactory): session tmpdir factory
+
+    Returns:
+      store (FixtureStore): the session fixture store
+    """
+    basetemp = tmpdir_factory.getbasetemp()
+    if xdist_worker() is not None and basetemp.basename == "popen-{}".format(xdist_worker()):
+        basetemp = basetemp.dirpath()
+    path = str(basetemp.join(STORE_DIRNAME))
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = FixtureStore(path)
+        return _stores[path]
+
+
+def stores():
+    """Return the fixture stores created in this session"""
+    return list(_stores.values())
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Streaming FASTQ subsampler.
+
+Reads are subsampled in a single pass over plain or gzipped FASTQ
+files, either to a fixed number of reads with seeded reservoir
+sampling, or to a fraction of reads with seeded Bernoulli sampling.
+The files of a read pair are read in lockstep and the same records
+are kept from each, so that pairs stay in sync. Memory is bounded by
+the number of sampled reads; Bernoulli sampling writes records as it
+goes. Sampled records are written in input order.
+
+Both samplers draw the gaps between sampled records rather than a
+random number per record (Algorithm L for the reservoir, geometric
+skips for Bernoulli sampling), so most records are skipped without
+touching the random number generator.
+
+Examples:
+
+   .. code-block:: python
+
+      subsample(["s_1.fastq.gz", "s_2.fastq.gz"], ["o_1.fastq.gz", "o_2.fastq.gz"],
+                n_reads=1000, seed=1)
+"""
+import os
+import gzip
+import json
+import math
+import random
+import shutil
+import hashlib
+import logging
+import contextlib
+from pytest_ngsfixtures.bgzf import BgzfWriter
+
+logger = logging.getLogger(__name__)
+
+# Default seed
+SEED = 100
+
+
+def _open(path):
+    with open(str(path), "rb") as fh:
+        gzipped = fh.read(2) == b"\x1f\x8b"
+    return gzip.open(str(path), "rb") if gzipped else open(str(path), "rb")
+
+
+def _create(path, threads):
+    if str(path).endswith(".gz"):
+        return BgzfWriter(path, threads=threads)
+    return open(str(path), "wb")
+
+
+def read_fastq(fh):
+    """Iterate over FASTQ records.
+
+    Args:
+      fh (file): FASTQ file opened in binary mode
+
+    Yields:
+      bytes: FASTQ record of four lines
+    """
+    lines = iter(fh)
+    for header in lines:
+        record = [header, next(lines, b""), next(lines, b""), next(lines, b"")]
+        if not header.startswith(b"@") or not record[3]:
+            raise ValueError("truncated or malformed FASTQ record '{}'".format(header.strip().decode(errors="replace")))
+        yield b"".join(record)
+
+
+def _records(fhs):
+    """Iterate over records of several files in lockstep"""
+    iterators = [read_fastq(fh) for fh in fhs]
+    sentinel = object()
+    while True:
+        records = [next(x, sentinel) for x in iterators]
+        if all(x is sentinel for x in records):
+            return
+        if any(x is sentinel for x in records):
+            raise ValueError("paired FASTQ files have different numbers of records")
+        yield records
+
+
+def _skip(rng, logp):
+    """Draw the number of records skipped before the next sampled
+    record, given log(1 - p) of the sampling probability p"""
+    return int(math.log(1.0 - rng.random()) / logp)
+
+
+def reservoir(items, n, seed=SEED):
+    """Sample n items uniformly with Algorithm L reservoir sampling.
+
+    Args:
+      items (iterable): items to sample from
+      n (int): sample size
+      seed (int): random seed
+
+    Returns:
+      list: sampled items, in input order
+    """
+    rng = random.Random(seed)
+    sample = []
+    it = enumerate(items)
+    for i, item in it:
+        sample.append((i, item))
+        if len(sample) == n:
+            break
+    if n <= 0 or len(sample) < n:
+        return [x for _, x in sample[:max(n, 0)]]
+    w = math.exp(math.log(1.0 - rng.random()) / n)
+    while True:
+        skip = int(math.log(1.0 - rng.random()) / math.log(1.0 - w)) if w < 1.0 else 0
+        for _ in range(skip):
+            if next(it, None) is None:
+                return [x for _, x in sorted(sample, key=lambda x: x[0])]
+        entry = next(it, None)
+        if entry is None:
+            return [x for _, x in sorted(sample, key=lambda x: x[0])]
+        sample[rng.randrange(n)] = entry
+        w *= math.exp(math.log(1.0 - rng.random()) / n)
+
+
+def bernoulli(items, fraction, seed=SEED):
+    """Sample each item with probability fraction.
+
+    Args:
+      items (iterable): items to sample from
+      fraction (float): sampling probability
+      seed (int): random seed
+
+    Yields:
+      item: sampled items, in input order
+    """
+    if fraction <= 0:
+        return
+    if fraction >= 1:
+        yield from items
+        return
+    rng = random.Random(seed)
+    logp = math.log(1.0 - fraction)
+    it = iter(items)
+    while True:
+        for _ in range(_skip(rng, logp)):
+            if next(it, None) is None:
+                return
+        item = next(it, None)
+        if item is None:
+            return
+        yield item
+
+
+def subsample(inputs, outputs, n_reads=None, fraction=None, seed=SEED, threads=1):
+    """Subsample FASTQ files.
+
+    Args:
+      inputs (list): input FASTQ file names; one file, or the files of
+                     a read pair
+      outputs (list): output FASTQ file names, one per input; names
+                      ending in .gz are written as BGZF
+      n_reads (int): number of reads to sample
+      fraction (float): fraction of reads to sample; ignored if n_reads is set
+      seed (int): random seed
+      threads (int): number of compression threads
+
+    Returns:
+      int: number of sampled reads
+    """
+    if len(inputs) != len(outputs):
+        raise ValueError("subsample needs one output per input")
+    if n_reads is None and fraction is None:
+        raise ValueError("subsample needs n_reads or fraction")
+    n = 0
+    with contextlib.ExitStack() as stack:
+        fhs = [stack.enter_context(_open(x)) for x in inputs]
+        records = _records(fhs)
+        if n_reads is not None:
+            sampled = reservoir(records, int(n_reads), seed=seed)
+        else:
+            sampled = bernoulli(records, float(fraction), seed=seed)
+        out = [stack.enter_context(_create(x, threads)) for x in outputs]
+        for pair in sampled:
+            for fh, record in zip(out, pair):
+                fh.write(record)
+            n += 1
+    return n
+
+
+def subsample_cached(cachedir, inputs, threads=1, **kwargs):
+    """Subsample FASTQ files, reusing cached output.
+
+    Output is stored in cachedir/{hash}, where hash covers the input
+    file names, sizes and modification times and the sampling
+    parameters, and named as the inputs.
+
+    Args:
+      cachedir (str): cache directory
+      inputs (list): input FASTQ file names
+      threads (int): number of compression threads
+      kwargs: sampling parameters; see :py:func:`subsample`
+
+    Returns:
+      list: file names of subsampled files
+    """
+    from pytest_ngsfixtures.store import filelock
+    inputs = [os.path.realpath(str(x)) for x in inputs]
+    key = {
+        'inputs': [(x, os.stat(x).st_size, os.stat(x).st_mtime_ns) for x in inputs],
+        'params': dict({'seed': SEED}, **kwargs),
+    }
+    h = hashlib.blake2b(json.dumps(key, sort_keys=True).encode(), digest_size=16).hexdigest()
+    path = os.path.join(str(cachedir), h)
+    outputs = [os.path.join(path, os.path.basename(x)) for x in inputs]
+    os.makedirs(str(cachedir), exist_ok=True)
+    with filelock(path + ".lock"):
+        if os.path.isdir(path):
+            return outputs
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        n = subsample(inputs, [os.path.join(tmp, os.path.basename(x)) for x in inputs],
+                      threads=threads, **kwargs)
+        logger.debug("subsampled {} reads from {}".format(n, ", ".join(inputs)))
+        os.rename(tmp, path)
+    return outputs
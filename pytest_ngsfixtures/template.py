@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Layout template engine.
+
+A layout template is a format string, such as
+``"{POP}/{SM}/{PU}/{SM}_{PU}_{read}.fastq.gz"``, whose fields are
+columns of a :py:class:`~pytest_ngsfixtures.sampletable.SampleTable`.
+Templates are compiled once, and rendering a template over a sample
+table selection yields destination and source file pairs that make
+up a layout.
+
+Template fields are the sample table columns (see
+:py:data:`~pytest_ngsfixtures.sampletable.FIELDS`) or their aliases in
+:py:data:`ALIASES`. Format specifications, conversions and index or
+attribute access are supported, e.g. ``{SM[0]}`` or ``{read:>2}``.
+"""
+import os
+import string
+import logging
+import operator
+import functools
+from pytest_ngsfixtures.sampletable import FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Template field aliases of sample table columns
+ALIASES = {
+    'SM': 'sample',
+    'PU': 'pu',
+    'POP': 'pop',
+    'BATCH': 'batch',
+    'FASTQ': 'fastq',
+    'READ': 'read',
+    'RUN': 'run',
+}
+
+
+class LayoutTemplate:
+    """Compiled layout template.
+
+    Args:
+      template (str): layout template
+
+    Attributes:
+      fields (tuple): sample table columns used by the template
+    """
+    def __init__(self, template):
+        self.template = template
+        fmt = []
+        fields = []
+        for literal, name, spec, conversion in string.Formatter().parse(template):
+            fmt.append(literal.replace("{", "{{").replace("}", "}}"))
+            if name is None:
+                continue
+            i = min([len(name)] + [name.index(x) for x in ".[" if x in name])
+            base, rest = name[:i], name[i:]
+            field = ALIASES.get(base, base)
+            if field not in FIELDS:
+                raise ValueError("invalid layout template '{}': no such field '{}'; fields are {}".format(
+                    template, base, ", ".join(list(FIELDS) + sorted(ALIASES))))
+            if field not in fields:
+                fields.append(field)
+            fmt.append("{{{}{}{}{}}}".format(
+                fields.index(field), rest,
+                "!" + conversion if conversion else "",
+                ":" + spec if spec else ""))
+        self.fields = tuple(fields)
+        self._format = "".join(fmt).format
+        if len(fields) > 1:
+            self._getter = operator.attrgetter(*fields)
+        else:
+            # attrgetter with a single attribute does not return a tuple
+            self._getter = lambda row: tuple(getattr(row, x) for x in fields)
+
+    def __repr__(self):
+        return "LayoutTemplate('{}')".format(self.template)
+
+    def render(self, row):
+        """Render the template for a sample record.
+
+        Args:
+          row (Sample): sample record
+
+        Returns:
+          str: destination file name
+        """
+        return self._format(*self._getter(row))
+
+    def generate(self, rows, srcdir):
+        """Generate layout entries.
+
+        Args:
+          rows (iterable): sample records
+          srcdir (str): directory of the sequence files
+
+        Yields:
+          tuple: destination and source file names
+        """
+        srcdir = str(srcdir)
+        for row in rows:
+            yield self._format(*self._getter(row)), os.path.join(srcdir, row.fastq)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_template(template):
+    """Compile a layout template.
+
+    Args:
+      template (str): layout template
+
+    Returns:
+      LayoutTemplate: the compiled template
+    """
+    return LayoutTemplate(template)
+
+
+@functools.lru_cache(maxsize=64)
+def _layout(template, rows, srcdir):
+    """Memoized layout by template, selected rows and source directory"""
+    return dict(compile_template(template).generate(rows, srcdir))
+
+
+def layout_from_template(template, table=None, srcdir=None, **selection):
+    """Build a layout from a template and a sample table selection.
+
+    Layouts are memoized by template, selected rows and source
+    directory in a bounded cache, so the key follows the table content
+    rather than the table object. Every call returns a new dictionary
+    that the caller may modify.
+
+    Examples:
+
+       .. code-block:: python
+
+          layout_from_template("{POP}/{SM}/{SM}_{read}.fastq.gz", pop="PUR", is_pool=False)
+
+    Args:
+      template (str): layout template
+      table (SampleTable): sample table; defaults to
+                           :py:data:`pytest_ngsfixtures.config.sampleinfo`
+      srcdir (str): directory of the sequence files; defaults to
+                    :py:data:`pytest_ngsfixtures.config.SAMPLES_DIR`
+      selection: sample table selection, see
+                 :py:meth:`~pytest_ngsfixtures.sampletable.SampleTable.where`
+
+    Returns:
+      dict: key value mapping of destination and source files
+    """
+    if table is None or srcdir is None:
+        from pytest_ngsfixtures import config
+        table = config.sampleinfo if table is None else table
+        srcdir = config.SAMPLES_DIR if srcdir is None else srcdir
+    rows = table.where(**selection) if selection else table
+    return dict(_layout(template, tuple(rows), str(srcdir)))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""FASTQ validation.
+
+FASTQ files, plain or gzipped, are read in large binary chunks that
+are split in lines and framed in records of four lines, so that checks
+run over whole chunks of records at a time instead of parsing records
+one by one. A file is valid if every record has a header starting with
+``@``, a separator starting with ``+`` and a quality string as long as
+the sequence.
+
+Read names are the first word of the header, without a ``/1`` or
+``/2`` mate suffix. Unique names are counted in a set of name hashes,
+and an order-dependent digest of the names is used to check that the
+files of a read pair list the same reads in the same order.
+
+Examples:
+
+   .. code-block:: python
+
+      def test_pipeline(samples):
+          assert_fastq(samples.join("s_1.fastq.gz"), samples.join("s_2.fastq.gz"), n_reads=1000)
+"""
+import gzip
+import hashlib
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes read at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class FastqError(ValueError):
+    """Invalid FASTQ file"""
+
+
+class FastqStats(namedtuple("FastqStats", ['path', 'records', 'unique', 'bases', 'digest'])):
+    """FASTQ validation result.
+
+    Args:
+      path (str): file name
+      records (int): number of records
+      unique (int): number of unique read names
+      bases (int): number of bases
+      digest (str): digest of the read names, in order
+    """
+    __slots__ = ()
+
+
+def _open(path):
+    with open(str(path), "rb") as fh:
+        gzipped = fh.read(2) == b"\x1f\x8b"
+    return gzip.open(str(path), "rb") if gzipped else open(str(path), "rb")
+
+
+def _name(header):
+    name = header[1:].split(None, 1)[0] if len(header) > 1 else b""
+    if name[-2:] in (b"/1", b"/2"):
+        return name[:-2]
+    return name
+
+
+def _check(path, first, headers, seqs, seps, quals):
+    """Check a chunk of records, reporting the first invalid record"""
+    if all(map(bytes.startswith, headers, [b"@"] * len(headers))) and \
+       all(map(bytes.startswith, seps, [b"+"] * len(seps))) and \
+       list(map(len, seqs)) == list(map(len, quals)):
+        return
+    for i, (h, s, p, q) in enumerate(zip(headers, seqs, seps, quals)):
+        if not h.startswith(b"@"):
+            msg = "header does not start with '@'"
+        elif not p.startswith(b"+"):
+            msg = "separator does not start with '+'"
+        elif len(s) != len(q):
+            msg = "sequence and quality lengths differ ({} != {})".format(len(s), len(q))
+        else:
+            continue
+        raise FastqError("{}: record {}: {}: {}".format(path, first + i + 1, msg, h.decode(errors="replace")))
+
+
+def validate_fastq(path, chunk_size=CHUNK_SIZE):
+    """Validate a FASTQ file.
+
+    Args:
+      path (str): FASTQ file name
+      chunk_size (int): number of bytes read at a time
+
+    Returns:
+      FastqStats: number of records, unique names and bases, and name digest
+
+    Raises:
+      FastqError: if a record is malformed or the file is truncated
+    """
+    path = str(path)
+    names = set()
+    digest = hashlib.blake2b(digest_size=16)
+    records = 0
+    bases = 0
+    rest = b""
+    with _open(path) as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if chunk:
+                lines = (rest + chunk).split(b"\n")
+            else:
+                # Allow a missing final newline and trailing blank lines
+                lines = rest.rstrip(b"\r\n").split(b"\n") + [b""] if rest.strip() else [b""]
+                if len(lines) % 4 != 1:
+                    raise FastqError("{}: truncated record after record {}".format(path, records))
+            # The last element is an incomplete line; complete lines are
+            # processed in whole records
+            n = (len(lines) - 1) // 4 * 4
+            rest = b"\n".join(lines[n:])
+            if n:
+                if lines[0].endswith(b"\r"):
+                    lines = [x.rstrip(b"\r") for x in lines[:n]]
+                headers, seqs, seps, quals = lines[0:n:4], lines[1:n:4], lines[2:n:4], lines[3:n:4]
+                _check(path, records, headers, seqs, seps, quals)
+                chunk_names = list(map(_name, headers))
+                names.update(map(hash, chunk_names))
+                digest.update(b"\n".join(chunk_names) + b"\n")
+                records += len(headers)
+                bases += sum(map(len, seqs))
+            if not chunk:
+                break
+    return FastqStats(path, records, len(names), bases, digest.hexdigest())
+
+
+def validate_pair(r1, r2, chunk_size=CHUNK_SIZE):
+    """Validate the FASTQ files of a read pair.
+
+    Args:
+      r1 (str): first read file name
+      r2 (str): second read file name
+      chunk_size (int): number of bytes read at a time
+
+    Returns:
+      tuple: FastqStats of r1 and r2
+
+    Raises:
+      FastqError: if a file is invalid or the files list different
+      reads or reads in a different order
+    """
+    s1 = validate_fastq(r1, chunk_size)
+    s2 = validate_fastq(r2, chunk_size)
+    if s1.records != s2.records:
+        raise FastqError("{} and {} have different numbers of records ({} != {})".format(
+            r1, r2, s1.records, s2.records))
+    if s1.digest != s2.digest:
+        raise FastqError("{} and {} have different read names or read order".format(r1, r2))
+    return s1, s2
+
+
+def assert_fastq(path, path2=None, n_reads=None, unique=True):
+    """Assert that a FASTQ file, or read pair, is valid.
+
+    Args:
+      path (str): FASTQ file name
+      path2 (str): second read file name of a read pair
+      n_reads (int): expected number of records
+      unique (bool): require unique read names
+
+    Returns:
+      FastqStats: validation result of path
+    """
+    __tracebackhide__ = True
+    try:
+        if path2 is None:
+            stats = validate_fastq(path)
+        else:
+            stats = validate_pair(path, path2)[0]
+    except FastqError as e:
+        raise AssertionError(str(e))
+    if n_reads is not None and stats.records != n_reads:
+        raise AssertionError("{}: expected {} records, found {}".format(path, n_reads, stats.records))
+    if unique and stats.unique != stats.records:
+        raise AssertionError("{}: {} records but {} unique read names".format(path, stats.records, stats.unique))
+    return stats
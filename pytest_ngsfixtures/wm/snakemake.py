@@ -4,12 +4,13 @@ import os
 import pytest
 import py
 import logging
-from pytest_ngsfixtures.os import safe_mktemp, safe_copy, safe_symlink
+from pytest_ngsfixtures.os import safe_mktemp, materialize, STORE_MODES
+from pytest_ngsfixtures.plugin import fixture_root
+from pytest_ngsfixtures.store import get_store
 from pytest_ngsfixtures.shell import shell
 from pytest_ngsfixtures.wm.utils import save_command
 
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -34,17 +35,24 @@ def snakefile(request, tmpdir_factory):
     options = {
         'dirname': '',
         'copy': True,
+        'mode': None,
         'snakefile': py.path.local(request.fspath.dirname).join("Snakefile"),
         'numbered': False,
-
+        'tmpfs': None,
     }
     if 'snakefile' in request.keywords:
         markers = {m.name: m for m in request.keywords.get("pytestmark")}
         options.update(markers['snakefile'].kwargs)
-    p = safe_mktemp(tmpdir_factory, **options)
+    root = fixture_root(request, options['tmpfs'])
+    if root:
+        root['size'] = py.path.local(options['snakefile']).size()
+    p = safe_mktemp(tmpdir_factory, **options, **root)
     src = options['snakefile']
-    f = safe_copy if options['copy'] else safe_symlink
-    dst = f(p, src)
+    mode = options['mode']
+    if mode is None:
+        mode = 'copy' if options['copy'] else 'symlink'
+    store = get_store(tmpdir_factory) if mode in STORE_MODES else None
+    dst, _ = materialize(p, src, mode=mode, store=store)
     return dst
 
 
@@ -24,6 +24,7 @@ test_requirements = [
 
 extras_require = {
     'tests': test_requirements,
+    'simulate': ['numpy'],
 }
 
 package_data = []
@@ -174,3 +174,14 @@ def image_args():
 @pytest.fixture
 def readfile():
     return py.path.local(SAMPLES_DIR / "CHS.HG00512_1.fastq.gz")
+
+
+@pytest.fixture
+def fd_limit():
+    """Lower the soft limit on open files to 256 above those in use"""
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    limit = len(os.listdir("/proc/self/fd")) + 256 if os.path.isdir("/proc/self/fd") else 512
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit, hard), hard))
+    yield min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
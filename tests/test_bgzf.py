@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+test_bgzf
+----------------------------------
+
+Tests for `pytest_ngsfixtures.bgzf` module.
+"""
+import os
+import gzip
+import struct
+import pytest
+from pytest_ngsfixtures.config import SAMPLES_DIR
+from pytest_ngsfixtures.bgzf import BgzfWriter, compress_file, compress_block, concatenate, \
+    BLOCK_SIZE, EOF_MARKER
+
+
+@pytest.fixture
+def data():
+    return os.urandom(100000) + b"ACGT" * 200000
+
+
+def _blocks(path):
+    """Walk the BGZF blocks of a file, returning their sizes"""
+    buf = open(str(path), "rb").read()
+    sizes = []
+    i = 0
+    while i < len(buf):
+        assert buf[i:i + 4] == b"\x1f\x8b\x08\x04"
+        assert buf[i + 12:i + 16] == b"BC\x02\x00"
+        bsize = struct.unpack("<H", buf[i + 16:i + 18])[0] + 1
+        sizes.append(bsize)
+        i += bsize
+    assert i == len(buf)
+    return sizes
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_bgzf(tmpdir, data, threads):
+    out = tmpdir.join("out.gz")
+    with BgzfWriter(out, threads=threads) as fh:
+        fh.write(data[:1000])
+        fh.write(data[1000:])
+    assert gzip.open(str(out)).read() == data
+    assert out.read_binary().endswith(EOF_MARKER)
+    sizes = _blocks(out)
+    assert len(sizes) == -(-len(data) // BLOCK_SIZE) + 1
+    assert all(x <= 0x10000 for x in sizes)
+
+
+def test_gzip_members(tmpdir, data):
+    out = tmpdir.join("out.gz")
+    with BgzfWriter(out, threads=2, bgzf=False, blocksize=100000) as fh:
+        fh.write(data)
+    assert gzip.open(str(out)).read() == data
+    assert not out.read_binary().endswith(EOF_MARKER)
+    assert out.read_binary().count(b"\x1f\x8b\x08\x00") >= 9
+
+
+def test_compress_block_limit():
+    with pytest.raises(ValueError):
+        compress_block(b"A" * (BLOCK_SIZE + 1))
+    assert len(compress_block(os.urandom(BLOCK_SIZE))) <= 0x10000
+
+
+def test_compress_file(tmpdir):
+    src = [str(SAMPLES_DIR / "CHS.HG00512_1.fastq.gz"), str(SAMPLES_DIR / "CHS.HG00513_1.fastq.gz")]
+    out = tmpdir.join("pool.fastq.gz")
+    compress_file(src, str(out), threads=2)
+    assert gzip.open(str(out)).read() == b"".join(gzip.open(x).read() for x in src)
+    _blocks(out)
+
+
+def test_concatenate(tmpdir):
+    a, b = tmpdir.join("a.gz"), tmpdir.join("b.gz")
+    with BgzfWriter(a, threads=1) as fh:
+        fh.write(b"A" * 100000)
+    with BgzfWriter(b, threads=1) as fh:
+        fh.write(b"C" * 10)
+    out = tmpdir.join("ab.gz")
+    assert concatenate([a, b], out)
+    assert gzip.open(str(out)).read() == b"A" * 100000 + b"C" * 10
+    assert out.read_binary().count(EOF_MARKER) == 1
+    _blocks(out)
+    src = [str(SAMPLES_DIR / "PUR.HG00731_1.fastq.gz"), str(a)]
+    assert not concatenate(src, str(out))
+    assert gzip.open(str(out)).read() == gzip.open(src[0]).read() + b"A" * 100000
+    assert out.size() == sum(os.path.getsize(x) for x in src) - len(EOF_MARKER)
+    plain = tmpdir.join("plain.txt")
+    plain.write("foo")
+    with pytest.raises(ValueError, match="not gzip"):
+        concatenate([str(plain)], str(out))
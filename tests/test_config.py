@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import sys
 import pytest
 import shutil
+import subprocess
+from collections.abc import Mapping
 from pytest_ngsfixtures.shell import shell
-from pytest_ngsfixtures.config import reflayout, layout, SAMPLES_DIR
+from pytest_ngsfixtures.config import reflayout, layout, SAMPLES_DIR, refselect
 
 
 @pytest.mark.samples(layout=[2,1])
@@ -25,6 +28,23 @@ def test_ref(ref):
     assert ref.join("scaffolds.fa").islink()
 
 
+@pytest.mark.ref(dirname="bundles", bundles=["scaffolds.fa", "variants"])
+def test_ref_bundles(ref):
+    assert sorted(x.basename for x in ref.listdir()) == [
+        'known.scaffolds.vcf.gz', 'known.scaffolds.vcf.gz.tbi',
+        'scaffolds.dict', 'scaffolds.fa', 'scaffolds.fa.fai']
+
+
+def test_refselect():
+    fasta = refselect("fasta")
+    assert "scaffoldsN.fa.fai" in fasta
+    assert "scaffolds.fa.fai" in fasta
+    assert not any(x.endswith(".gtf") for x in fasta)
+    assert list(refselect(["foo.fasta"], layout={'foo.fasta': 'foo.fasta', 'bar.fasta': 'bar.fasta'})) == ['foo.fasta']
+    with pytest.raises(ValueError):
+        refselect(["foo"])
+
+
 @pytest.mark.skipif(shutil.which("bwa") is None, reason="executable bwa not found")
 @pytest.mark.skipif(shutil.which("samtools") is None, reason="executable samtools not found")
 def test_data(samples, ref):
@@ -72,3 +92,39 @@ def test_layouts_request(samples, ref, testunit, dirname, copy):
         assert samples.join("s1_1.fastq.gz").islink()
     elif testunit == "bar":
         assert samples.join("s1_1.fastq.gz").isfile()
+
+
+# Maximum time in seconds spent in pytest_ngsfixtures modules when
+# importing the plugin
+IMPORT_TIME_BUDGET = 0.05
+
+
+def test_import_lazy():
+    code = ("import logging, pytest_ngsfixtures.plugin, pytest_ngsfixtures.config as c; "
+            "assert c.reflayout._layout is None; assert not c.layout._cache; "
+            "assert not logging.getLogger().handlers")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_import_time():
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import pytest; import pytest_ngsfixtures.plugin"],
+                          check=True, stderr=subprocess.PIPE, universal_newlines=True)
+    self_us = [int(x.split("|")[0].split(":")[1]) for x in proc.stderr.splitlines()
+               if x.split("|")[-1].strip().startswith("pytest_ngsfixtures")]
+    assert self_us
+    assert sum(self_us) / 1e6 < IMPORT_TIME_BUDGET
+
+
+def test_reflayout():
+    assert isinstance(reflayout, Mapping)
+    assert "scaffolds.fa.fai" in reflayout
+    assert "Makefile" not in reflayout
+    assert dict(reflayout) == dict(reflayout.items())
+
+
+def test_layout_registry():
+    assert "pop_sample" in layout
+    assert len(layout["pop_sample"]) == 6
+    assert layout["pop_sample"] is layout["pop_sample"]
+    with pytest.raises(KeyError):
+        layout["foo"]
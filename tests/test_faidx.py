@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+test_faidx
+----------------------------------
+
+Tests for `pytest_ngsfixtures.faidx` module.
+"""
+import pytest
+from pytest_ngsfixtures.config import REF_DIR
+from pytest_ngsfixtures.refcache import reference
+from pytest_ngsfixtures.faidx import build_fai, read_fai, FastaFile
+
+
+@pytest.fixture
+def fasta(tmpdir):
+    p = tmpdir.join("test.fa")
+    p.write(">s1 first\nACGTA\nCGTAC\nGT\n>s2\nAAAAA\nCC\n>s3\nTTT")
+    return p
+
+
+@pytest.mark.parametrize("name", ["scaffolds.fa", "scaffoldsN.fa"])
+def test_build_fai(name, tmpdir):
+    fai = tmpdir.join(name + ".fai")
+    build_fai(reference(name), str(fai))
+    assert fai.read() == (REF_DIR / (name + ".fai")).read_text()
+    assert read_fai(str(fai)) == build_fai(reference(name))
+
+
+def test_build_fai_line_length(tmpdir):
+    p = tmpdir.join("bad.fa")
+    p.write(">s1\nACGT\nAC\nACGT\n")
+    with pytest.raises(ValueError, match="different line length"):
+        build_fai(str(p))
+
+
+def test_fetch(fasta):
+    with FastaFile(str(fasta)) as fa:
+        assert fa.references == ["s1", "s2", "s3"]
+        assert fa.lengths == [12, 7, 3]
+        assert fa.fetch("s1") == b"ACGTACGTACGT"
+        assert fa.fetch("s1", 3, 8) == b"TACGT"
+        assert fa.fetch("s1", 5, 5) == b""
+        assert fa.fetch("s2", 4, 100) == b"ACC"
+        assert fa.fetch("s3", 1) == b"TT"
+        with pytest.raises(KeyError):
+            fa.fetch("s4")
+        with pytest.raises(ValueError):
+            fa.fetch("s1", 8, 3)
+    assert fasta.dirpath().join("test.fa.fai").check()
+
+
+def test_fetch_type(fasta):
+    with FastaFile(str(fasta)) as fa:
+        # Regions within a line and regions spanning lines
+        for region in [("s3",), ("s1", 5, 8), ("s1", 3, 8), ("s1", 5, 5)]:
+            assert isinstance(fa.fetch(*region), bytes)
+
+
+def test_fetch_view(fasta):
+    fa = FastaFile(str(fasta))
+    seq = fa.fetch_view("s3")
+    assert isinstance(seq, memoryview) and seq.readonly and seq == b"TTT"
+    assert fa.fetch_view("s1", 5, 8) == b"CGT"
+    assert fa.fetch_view("s1", 5, 5) == b""
+    with pytest.raises(ValueError, match="spans lines"):
+        fa.fetch_view("s1", 3, 8)
+    fa.close()
+    assert seq.tobytes() == b"TTT"
+
+
+def test_fetch_symlinked_index(fasta, tmpdir):
+    build_fai(str(fasta), str(fasta) + ".fai")
+    d = tmpdir.mkdir("link")
+    d.join("test.fa").write(fasta.read())
+    d.join("test.fa.fai").mksymlinkto(tmpdir.join("missing.fai"))
+    with FastaFile(str(d.join("test.fa"))) as fa:
+        assert fa.fetch("s2", 4) == b"ACC"
+    assert not tmpdir.join("missing.fai").check()
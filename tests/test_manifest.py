@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+test_manifest
+----------------------------------
+
+Tests for `pytest_ngsfixtures.manifest` module.
+"""
+import shutil
+import pytest
+from pytest_ngsfixtures import DATA_DIR
+from pytest_ngsfixtures import manifest as ngsmanifest
+from pytest_ngsfixtures.manifest import build_manifest, read_manifest, write_manifest, verify, data_files
+
+
+def test_manifest_uptodate():
+    assert read_manifest() == build_manifest(threads=4)
+
+
+@pytest.fixture
+def datadir(tmpdir):
+    for name in ["ref/scaffolds.fa.fai", "seq/CHS.HG00512_1.fastq.gz"]:
+        tmpdir.join(name).dirpath().ensure(dir=True)
+        shutil.copy(str(DATA_DIR / name), str(tmpdir.join(name)))
+    write_manifest(build_manifest(str(tmpdir)), str(tmpdir.join(ngsmanifest.MANIFEST)))
+    return tmpdir
+
+
+def test_verify(datadir, monkeypatch):
+    assert data_files(str(datadir)) == ["ref/scaffolds.fa.fai", "seq/CHS.HG00512_1.fastq.gz"]
+    problems, state = verify(str(datadir), threads=2)
+    assert problems == []
+    assert sorted(state) == data_files(str(datadir))
+    # Unchanged files are not hashed again
+    monkeypatch.setattr(ngsmanifest, "digest", None)
+    assert verify(str(datadir), state=state) == ([], state)
+
+
+def test_verify_problems(datadir):
+    fai = datadir.join("ref", "scaffolds.fa.fai")
+    fai.write(fai.read().replace("scaffold1", "scaffoldX"))
+    datadir.join("seq", "CHS.HG00512_1.fastq.gz").remove()
+    problems, state = verify(str(datadir))
+    assert problems == [("ref/scaffolds.fa.fai", "checksum differs from manifest"),
+                        ("seq/CHS.HG00512_1.fastq.gz", "missing")]
+    assert state == {}
+
+
+def test_verify_data_option(testdir):
+    testdir.makepyfile("def test_foo():\n    pass\n")
+    result = testdir.runpytest("--ngs-verify-data")
+    result.assert_outcomes(passed=1)
+    assert testdir.tmpdir.join(".pytest_cache", "v", "ngsfixtures", "verified-data").check()
@@ -7,7 +7,13 @@ Tests for `pytest_ngsfixtures.os` module.
 """
 import os
 import py
-from pytest_ngsfixtures.os import safe_mktemp, safe_symlink, safe_copy
+import getpass
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pytest_ngsfixtures.os import _run, safe_mktemp, safe_symlink, safe_copy, CopyEngine, COPY_STRATEGIES, materialize_data, plan_data, parse_size, fixture_root, cleanup_fixture_roots, uptodate, localpath
+from pytest_ngsfixtures.config import layout
+from pytest_ngsfixtures.store import FixtureStore
 
 
 def test_safe_mktemp(tmpdir_factory):
@@ -26,6 +32,39 @@ def test_safe_mktemp(tmpdir_factory):
     assert p == bn.join("foo/bar0")
 
 
+def test_safe_mktemp_concurrent(tmpdir_factory):
+    bn = tmpdir_factory.getbasetemp()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        shared = list(executor.map(lambda i: safe_mktemp(tmpdir_factory, dirname="concurrent"), range(16)))
+        numbered = list(executor.map(lambda i: safe_mktemp(tmpdir_factory, dirname="concurrent/n", numbered=True), range(16)))
+    assert set(shared) == {bn.join("concurrent")}
+    assert len(set(numbered)) == 16
+
+
+def test_safe_mktemp_root(tmpdir_factory):
+    root = tmpdir_factory.mktemp("fixture_root")
+    p = safe_mktemp(tmpdir_factory, dirname="foo", root=root, size=10, budget="1K")
+    assert p.relto(root)
+    assert p.dirpath().basename.startswith("pytest-ngsfixtures-{}-".format(getpass.getuser()))
+    p = safe_mktemp(tmpdir_factory, dirname="foo", numbered=True, root=root)
+    assert p.basename == "foo0"
+    p = safe_mktemp(tmpdir_factory, dirname="foo", numbered=True, root=root)
+    assert p.basename == "foo1"
+    p = safe_mktemp(tmpdir_factory, dirname="bar", root=root, size=2000)
+    assert p == tmpdir_factory.getbasetemp().join("bar")
+    # Setting up a directory again is not charged twice
+    froot = fixture_root(root)
+    used = froot.used
+    safe_mktemp(tmpdir_factory, dirname="foo", root=root, size=10, budget="1K")
+    assert froot.used == used
+    basetemp = froot.getbasetemp()
+    cleanup_fixture_roots()
+    assert not basetemp.exists()
+    assert froot.used == 0
+    assert parse_size("1.5K") == 1536
+    assert parse_size("2G") == 2 * 1024 ** 3
+
+
 def test_safe_symlink(tmpdir_factory, readfile):
     p = tmpdir_factory.mktemp("safe_symlink")
     # Test using string as input without capturing return
@@ -57,3 +96,140 @@ def test_safe_copy(tmpdir_factory, readfile):
     # fixture
     assert c.size() == readfile.size()
     assert c.computehash() == readfile.computehash()
+
+
+@pytest.mark.parametrize("strategy", COPY_STRATEGIES)
+def test_copy_engine(tmpdir_factory, readfile, strategy):
+    p = tmpdir_factory.mktemp("copy_engine")
+    engine = CopyEngine(strategies=[strategy, "userspace"])
+    assert engine.strategy(readfile, p) is None
+    used = engine.copy(readfile, p.join("foo.bar"))
+    assert used in [strategy, "userspace"]
+    assert engine.strategy(readfile, p) == used
+    assert p.join("foo.bar").computehash() == readfile.computehash()
+    # Cached strategy is reused for the same device pair
+    assert engine.copy(readfile, p.join("bar.foo")) == used
+    with pytest.raises(FileExistsError):
+        engine.copy(readfile, p.join("foo.bar"))
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+@pytest.mark.parametrize("fast", [True, False])
+def test_materialize_data(tmpdir_factory, threads, fast):
+    p = tmpdir_factory.mktemp("materialize_data")
+    data = layout['pop_sample_project_run']
+    results = materialize_data(p, data, mode="symlink", threads=threads, fast=fast)
+    assert [str(dst) for dst, _ in results] == [str(p.join(x)) for x in data]
+    assert all(dst.islink() for dst, _ in results)
+    results = materialize_data(p, data, mode="symlink", threads=threads, ignore_errors=True, fast=fast)
+    assert all(strategy is None for _, strategy in results)
+    p.join(list(data)[1]).remove()
+    with pytest.raises(OSError) as e:
+        materialize_data(p, data, mode="symlink", threads=threads, fast=fast)
+    assert list(data)[0] in str(e.value)
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_run_first_error(threads):
+    done = []
+
+    def func(x):
+        if x == 1:
+            raise ValueError(x)
+        time.sleep(0.05)
+        done.append(x)
+        return x
+
+    assert _run(func, [0, 2, 3], threads) == [0, 2, 3]
+    done.clear()
+    with pytest.raises(ValueError):
+        _run(func, list(range(20)), threads)
+    assert len(done) < 10
+
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink", "auto", "store"])
+def test_materialize_data_fast(tmpdir_factory, mode):
+    p = tmpdir_factory.mktemp("materialize_data_fast")
+    store = FixtureStore(tmpdir_factory.mktemp("store"))
+    data = layout['pop_sample_project_run']
+    assert plan_data(p, data)[0][0] == "CHS"
+    for dst, strategy in materialize_data(p, data, mode=mode, store=store):
+        assert strategy is not None
+        assert dst.computehash() == py.path.local(data[dst.relto(p)]).computehash()
+    assert plan_data(p, {"../foo": "ref/scaffolds.fa"}) is None
+
+
+@pytest.mark.parametrize("mode", ["copy", "symlink", "hardlink", "auto"])
+@pytest.mark.parametrize("incremental", [True, "hash"])
+def test_materialize_data_incremental(tmpdir_factory, mode, incremental):
+    p = tmpdir_factory.mktemp("materialize_data_incremental")
+    data = dict(layout['sample_project_run'])
+    data["ref.fa"] = "ref/scaffolds.fa"
+    results = materialize_data(p, data, mode=mode, incremental=incremental)
+    assert "uptodate" not in [strategy for _, strategy in results]
+    results = materialize_data(p, data, mode=mode, incremental=incremental)
+    assert all(strategy == "uptodate" for _, strategy in results)
+    stale = p.join("ref.fa")
+    stale.remove()
+    stale.write("foo")
+    p.join(list(layout['sample_project_run'])[0]).remove()
+    results = materialize_data(p, data, mode=mode, incremental=incremental)
+    assert [strategy == "uptodate" for _, strategy in results].count(False) == 2
+    assert stale.read() == localpath("ref/scaffolds.fa").read()
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_materialize_data_many_dirs(tmpdir, fd_limit, threads):
+    src = localpath("seq/CHS.HG00512_1.fastq.gz")
+    data = {"d{}/s{}_{}.fastq.gz".format(i // 2, i // 2, i % 2 + 1): src for i in range(4 * fd_limit)}
+    data.update({"d{}/x.fastq.gz".format(i): src for i in range(0, 4 * fd_limit, 3)})
+    results = materialize_data(tmpdir, data, mode="symlink", threads=threads)
+    assert [dst.relto(tmpdir) for dst, _ in results] == list(data)
+    assert all(strategy == "symlink" for _, strategy in results)
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_materialize_data_directory(tmpdir, fast):
+    src = tmpdir.mkdir("src")
+    src.join("foo.txt").write("foo")
+    p = tmpdir.join("fixture")
+    results = materialize_data(p, {"sub/dir": str(src), "dir": str(src)}, mode="copy", fast=fast)
+    assert [dst for dst, _ in results] == [p.join("sub", "dir"), p.join("dir")]
+    assert p.join("sub", "dir", "foo.txt").read() == "foo"
+    assert p.join("dir", "foo.txt").read() == "foo"
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_materialize_data_hardlink(tmpdir, fast):
+    src = tmpdir.join("src.txt")
+    src.write("foo")
+    mode = os.stat(str(src)).st_mode
+    store = FixtureStore(tmpdir.join("store"))
+    (dst, strategy), = materialize_data(tmpdir, {"dst.txt": str(src)}, mode="hardlink", store=store, fast=fast)
+    assert strategy == "hardlink"
+    assert dst.samefile(store.add(src)) and not dst.samefile(src)
+    assert os.stat(str(src)).st_mode == mode
+    # Writing to the fixture file leaves the source intact
+    os.chmod(str(dst), 0o644)
+    dst.write("bar")
+    assert src.read() == "foo"
+    # Without a store, files are copied
+    (dst, strategy), = materialize_data(tmpdir, {"copy.txt": str(src)}, mode="hardlink", fast=fast)
+    assert strategy in COPY_STRATEGIES
+    assert not dst.samefile(src)
+
+
+def test_uptodate(tmpdir):
+    src = tmpdir.join("src.txt")
+    src.write("foo")
+    dst = tmpdir.join("dst.txt")
+    assert not uptodate(src, dst)
+    dst.write("foo")
+    os.utime(str(dst), ns=(0, 0))
+    assert not uptodate(src, dst)
+    assert uptodate(src, dst, checksum=True)
+    assert uptodate(src, dst)
+    dst.write("bar")
+    os.utime(str(dst), ns=(os.stat(str(src)).st_atime_ns, os.stat(str(src)).st_mtime_ns))
+    assert uptodate(src, dst)
+    assert not uptodate(src, dst, mode="symlink")
@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
+import gc
+import json
+import threading
 import pytest
-from pytest_ngsfixtures.plugin import Fixture
+from pytest_ngsfixtures.plugin import Fixture, IO_REPORT_PROPERTY
+from pytest_ngsfixtures.os import COPY_STRATEGIES, MODES, FixtureRoot, localpath
+from pytest_ngsfixtures.store import get_store
+from pytest_ngsfixtures.config import layout
+from pytest_ngsfixtures.sampletable import SampleTable
 
 
 @pytest.mark.testdata(dirname="foo")
@@ -27,3 +35,223 @@ def test_fixture_testdata_testunit_class():
 def test_fixture_testdata_path_class(tmpdir_factory):
     p = Fixture(dirname="foo", path=tmpdir_factory.getbasetemp().join("bar"))
     assert str(p).endswith("bar")
+
+
+@pytest.mark.testdata(dirname="strategy", data={'foo.fastq.gz': 'seq/CHS.HG00512_1.fastq.gz'})
+def test_fixture_testdata_strategy(testdata):
+    assert list(testdata.strategies) in [[x] for x in COPY_STRATEGIES]
+
+
+@pytest.mark.testdata(dirname="hardlink", data={'foo.fastq.gz': 'seq/CHS.HG00512_1.fastq.gz'}, mode="hardlink")
+def test_fixture_testdata_hardlink(testdata, tmpdir_factory):
+    foo = testdata.join("foo.fastq.gz")
+    src = localpath("seq/CHS.HG00512_1.fastq.gz")
+    data = src.read_binary()
+    assert not foo.islink()
+    assert not foo.samefile(src)
+    assert os.access(str(src), os.W_OK)
+    if get_store(tmpdir_factory).dev == os.stat(str(testdata)).st_dev:
+        assert dict(testdata.strategies) == {"hardlink": 1}
+    else:
+        assert "hardlink" not in testdata.strategies
+    os.chmod(str(foo), 0o644)
+    foo.write("foo")
+    assert src.read_binary() == data
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_fixture_testdata_mode(mode):
+    p = Fixture(dirname="mode_{}".format(mode), data={'foo.txt': 'ref/scaffolds.fa.fai'}, mode=mode)
+    assert p.join("foo.txt").read() == localpath("ref/scaffolds.fa.fai").read()
+    assert sum(p.strategies.values()) == 1
+
+
+def test_fixture_tmpdir_factory(tmpdir):
+    factory = FixtureRoot(tmpdir)
+    p = Fixture(dirname="factory", data={'foo.txt': 'ref/scaffolds.fa.fai'}, mode="store",
+                tmpdir_factory=factory)
+    assert p.relto(factory.getbasetemp())
+    assert get_store(factory).path.relto(tmpdir)
+
+
+def test_fixture_testdata_mode_invalid():
+    with pytest.raises(ValueError):
+        Fixture(dirname="mode_invalid", data={'foo.txt': 'ref/scaffolds.fa.fai'}, mode="foo")
+
+
+def test_fixture_testdata_incremental():
+    data = {'foo.txt': 'ref/scaffolds.fa.fai', 'bar.txt': 'ref/scaffolds.fa'}
+    p = Fixture(dirname="incremental", data=data, incremental=True)
+    assert p.strategies["uptodate"] == 0
+    p.join("foo.txt").write("foo")
+    p = Fixture(dirname="incremental", data=data, incremental=True)
+    assert p.strategies["uptodate"] == 1
+    assert p.join("foo.txt").read() == localpath("ref/scaffolds.fa.fai").read()
+
+
+@pytest.mark.samples(dirname="threads", threads=4, layout=layout['sample_project_run'])
+def test_fixture_samples_threads(samples):
+    assert sum(samples.strategies.values()) == len(layout['sample_project_run'])
+
+
+@pytest.mark.ref(dirname="lazy_ref", lazy=True, mode="store")
+def test_fixture_ref_lazy(ref):
+    assert not os.path.exists(str(ref) + "/scaffolds.fa")
+    assert ref.join("scaffolds.fa").exists()
+    assert sum(ref.strategies.values()) == 1
+    assert not os.path.exists(str(ref) + "/scaffoldsN.fa")
+    ref.materialize("scaffoldsN.fa")
+    assert os.path.exists(str(ref) + "/scaffoldsN.fa")
+    assert os.fspath(ref) == str(ref)
+    assert os.path.exists(str(ref) + "/known.scaffolds.vcf.gz")
+
+
+@pytest.mark.samples(dirname="lazy_samples", lazy=True, layout=layout['sample_project_run'])
+def test_fixture_samples_lazy(samples):
+    assert len(samples.join("PUR.HG00731").join("p1").listdir()) == 1
+    assert not os.path.exists(str(samples) + "/PUR.HG00733")
+    assert len([x for x in samples.visit() if x.isfile()]) == len(layout['sample_project_run'])
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_fixture_lazy_threads(tmpdir_factory, incremental):
+    src = tmpdir_factory.mktemp("lazy_threads_src")
+    src.join("foo.txt").write("foo")
+    data = {'d/a.txt': 'ref/scaffolds.fa.fai', 'd/b.txt': 'ref/scaffolds.bed', 'd/src': str(src),
+            'c.txt': 'ref/scaffolds.dict'}
+    p = Fixture(dirname="lazy_threads_{}".format(incremental), data=data, mode="store", lazy=True,
+                threads=4, incremental=incremental)
+    t = threading.Thread(target=p.materialize, args=("d",), daemon=True)
+    t.start()
+    t.join(30)
+    assert not t.is_alive(), "materialize deadlocked"
+    assert sorted(os.listdir(str(p) + "/d")) == ["a.txt", "b.txt", "src"]
+    assert not os.path.exists(str(p) + "/c.txt")
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="/dev/shm not found")
+@pytest.mark.samples(dirname="tmpfs", tmpfs=True)
+def test_fixture_samples_tmpfs(samples):
+    assert str(samples).startswith("/dev/shm")
+    assert samples.join("s1_1.fastq.gz").exists()
+
+
+@pytest.mark.samples(dirname="io")
+def test_fixture_samples_io(samples, request):
+    assert samples.io['files'] == len(layout['flat'])
+    if samples.strategies["reflink"]:
+        assert samples.io['bytes'] == 0
+    else:
+        assert samples.io['bytes'] == sum(x.size() for x in samples.listdir())
+    assert samples.io_report()['nodeid'] == request.node.nodeid
+
+
+@pytest.mark.parametrize("mode", ["symlink", "hardlink"])
+def test_fixture_samples_io_links(mode):
+    p = Fixture(dirname="io_{}".format(mode), data=layout['flat'], mode=mode)
+    assert p.io['files'] == len(layout['flat'])
+    if mode == "symlink" or p.strategies["hardlink"]:
+        assert p.io['bytes'] == 0
+
+
+def test_fixture_io_report(testdir):
+    testdir.makepyfile("""
+        def test_samples(samples):
+            assert samples.listdir()
+    """)
+    result = testdir.runpytest("--ngs-io-report=json:io.json")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["*ngsfixtures io*", "1 fixtures: 2 files*", "*::test_samples::samples copy*"])
+    report = json.loads(testdir.tmpdir.join("io.json").read())
+    assert report[0]['files'] == 2
+    result = testdir.runpytest("--ngs-io-report=csv")
+    assert result.ret != 0
+
+
+def test_fixture_io_report_junitxml(testdir):
+    testdir.makepyfile("""
+        def test_samples(samples):
+            assert samples.listdir()
+    """)
+    result = testdir.runpytest("--junitxml=junit.xml")
+    result.stdout.fnmatch_lines(["*ngsfixtures io*", "1 fixtures: 2 files*"])
+    assert IO_REPORT_PROPERTY not in testdir.tmpdir.join("junit.xml").read()
+    result = testdir.runpytest("--junitxml=junit.xml", "--ngs-io-report=json:io.json")
+    result.stdout.fnmatch_lines(["1 fixtures: 2 files*"])
+    assert IO_REPORT_PROPERTY in testdir.tmpdir.join("junit.xml").read()
+
+
+@pytest.mark.samples(dirname="template", layout_template="{POP}/{SM}_{read}.fastq.gz",
+                     selection={'pop': 'YRI', 'is_pool': False})
+def test_fixture_samples_layout_template(samples):
+    assert sorted(x.basename for x in samples.join("YRI").listdir()) == [
+        "YRI.NA19238_1.fastq.gz", "YRI.NA19238_2.fastq.gz", "YRI.NA19239_1.fastq.gz", "YRI.NA19239_2.fastq.gz"]
+
+
+@pytest.mark.samples(dirname="scale", scale=100)
+def test_fixture_samples_scale(samples):
+    assert len(samples.sampletable) == 200
+    assert samples.strategies == {'symlink': 200}
+    table = SampleTable.from_file(samples.join("samplesheet.tsv"))
+    assert list(table) == list(samples.sampletable)
+    assert all(samples.join(x.fastq).check(link=1) for x in table)
+    assert table[0].sample == "CHS.SYN00"
+    assert table.values("pop") == ["CHS", "PUR", "YRI"]
+
+
+def test_fixture_samples_scale_fd_limit(fd_limit):
+    # One directory per virtual sample and run, more than open files allowed
+    n = 2 * fd_limit
+    p = Fixture('samples', dirname="scale_fd_limit", scale=n)
+    assert len(p.sampletable) == 2 * n
+    assert p.strategies == {'symlink': 2 * n}
+    assert all(p.join(x.fastq).check(link=1) for x in p.sampletable)
+
+
+@pytest.mark.ref(dirname="ref_fetch", bundles=["scaffolds.fa", "pAcGFP1-N1.fasta"])
+def test_ref_fetch(ref):
+    seq = "".join(x.strip() for x in ref.join("scaffolds.fa").readlines() if not x.startswith(">"))
+    assert ref.fetch("scaffold1", 1000, 1100) == seq[1000:1100].encode()
+    assert ref.fetch("pAcGFP1-N1", 0, 10) == b"TAGTTATTAA"
+    assert ref.fetch("scaffold1", 0, 10, fasta="scaffolds.fa") == seq[:10].encode()
+    with pytest.raises(KeyError):
+        ref.fetch("chr1")
+
+
+def test_fixture_close():
+    p = Fixture(dirname="close", data={'genome.fa': 'ref/scaffolds.fa'})
+    seq = p.fetch("scaffold1", 0, 10)
+    fa, = p._fasta.values()
+    p.close()
+    assert fa._fh.closed and not p._fasta
+    assert p.fetch("scaffold1", 0, 10) == seq
+    fa, = p._fasta.values()
+    # Fixtures without a request close their files when collected
+    del p
+    gc.collect()
+    assert fa._fh.closed
+
+
+def test_fixture_sidecars(tmpdir):
+    p = Fixture(dirname="sidecars", data={'genome.fa': 'ref/scaffolds.fa'}, sidecars=True)
+    assert sorted(x.basename for x in p.listdir()) == [
+        "genome.chrom.sizes", "genome.dict", "genome.fa", "genome.fa.fai", "genome.interval_list"]
+    assert p.join("genome.fa.fai").read() == localpath("ref/scaffolds.fa.fai").read()
+    assert "\tUR:file:{}\n".format(p.join("genome.fa")) in p.join("genome.dict").read()
+
+
+@pytest.mark.samples(dirname="pool", layout_template="{SM}_{read}.fastq.gz", selection={'pop': 'PUR', 'is_pool': False},
+                     pool={'PUR': ['PUR.HG00731', 'PUR.HG00733']})
+def test_samples_pool(samples):
+    assert sorted(x.basename for x in samples.listdir()) == [
+        "PUR.HG00731_1.fastq.gz", "PUR.HG00731_2.fastq.gz", "PUR.HG00733_1.fastq.gz",
+        "PUR.HG00733_2.fastq.gz", "PUR_1.fastq.gz", "PUR_2.fastq.gz"]
+    for read in (1, 2):
+        members = [samples.join("PUR.HG00731_{}.fastq.gz".format(read)), samples.join("PUR.HG00733_{}.fastq.gz".format(read))]
+        pooled = samples.join("PUR_{}.fastq.gz".format(read))
+        assert pooled.read_binary() == b"".join(x.read_binary() for x in members)
+
+
+def test_samples_pool_missing():
+    with pytest.raises(ValueError, match="no sequence files of sample 'foo'"):
+        Fixture(dirname="pool_missing", data=layout['flat'], pool=['foo'])
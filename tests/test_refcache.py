@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+test_refcache
+----------------------------------
+
+Tests for `pytest_ngsfixtures.refcache` module.
+"""
+import os
+import pytest
+from pytest_ngsfixtures import refcache
+from pytest_ngsfixtures.config import REF_DIR
+from pytest_ngsfixtures.faidx import FastaFile, build_fai
+from pytest_ngsfixtures.os import localpath
+from pytest_ngsfixtures.refcache import reference, mask, read_bed, cache_root, cache_dir
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("NGSFIXTURES_CACHE_DIR", str(tmpdir.join("cache")))
+    # Restore the session cache directory afterwards
+    monkeypatch.setitem(refcache.__dict__, "_cache_dir", None)
+    monkeypatch.delitem(refcache.__dict__, "_cache_dir")
+    return tmpdir.join("cache")
+
+
+def test_cache_root(monkeypatch):
+    monkeypatch.delenv("NGSFIXTURES_CACHE_DIR", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", "/xdg")
+    assert cache_root() == "/xdg/pytest-ngsfixtures"
+    monkeypatch.setenv("NGSFIXTURES_CACHE_DIR", "/ngs")
+    assert cache_root() == "/ngs"
+
+
+def test_cache_dir_versioned(cache, monkeypatch):
+    d = cache_dir()
+    assert os.path.dirname(d) == str(cache)
+    monkeypatch.delitem(refcache.__dict__, "_cache_dir")
+    monkeypatch.setattr(refcache, "VERSION", refcache.VERSION + 1)
+    assert cache_dir() != d
+
+
+def test_mask(tmpdir):
+    p = tmpdir.join("test.fa")
+    p.write(">s1\nACGTA\nCGTAC\nGT\n>s2\nAAAAA\n")
+    data = bytearray(p.read_binary())
+    mask(data, build_fai(str(p)), [("s1", 3, 11), ("s2", 4, 10)])
+    assert data == b">s1\nACGNN\nNNNNN\nNT\n>s2\nAAAAN\n"
+
+
+def test_reference(cache):
+    path = reference("scaffoldsN.fa")
+    assert path == os.path.join(cache_dir(), "scaffoldsN.fa")
+    assert sorted(x for x in os.listdir(cache_dir()) if x.endswith(".fa")) == ["scaffolds.fa", "scaffoldsN.fa"]
+    mtime = os.stat(path).st_mtime_ns
+    assert reference("scaffoldsN.fa") == path
+    assert os.stat(path).st_mtime_ns == mtime
+    with FastaFile(path) as fa, FastaFile(reference("scaffolds.fa")) as ref:
+        assert fa.lengths == ref.lengths
+        name, start, end = read_bed(str(REF_DIR / "scaffoldsN.bed"))[0]
+        assert fa.fetch(name, start, end) == b"N" * (end - start)
+        assert fa.fetch(name, 0, start) == ref.fetch(name, 0, start)
+
+
+def test_reference_unknown(cache):
+    with pytest.raises(ValueError, match="no such compressed reference"):
+        reference("foo.fa")
+
+
+def test_localpath(cache):
+    assert not (REF_DIR / "scaffolds.fa").exists()
+    assert localpath("ref/scaffolds.fa").strpath == reference("scaffolds.fa")
+    assert localpath("ref/scaffolds.fa.fai").strpath == str(REF_DIR / "scaffolds.fa.fai")
+
+
+def test_reflayout():
+    from pytest_ngsfixtures.config import reflayout
+    assert "scaffolds.fa.gz" not in reflayout
+    assert reflayout["scaffoldsN.fa"] == reference("scaffoldsN.fa")
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+test_sampletable
+----------------------------------
+
+Tests for `pytest_ngsfixtures.sampletable` module.
+"""
+import pytest
+from pytest_ngsfixtures.sampletable import SampleTable, Sample, fanout
+from pytest_ngsfixtures.config import sampleinfo
+
+
+def test_sampleinfo():
+    assert len(sampleinfo) == 26
+    sm, pu, pop, batch, fq, read, run, pool = sampleinfo[0]
+    assert (sm, pool) == ("CHS.HG00512", False)
+    assert isinstance(sampleinfo[0], Sample)
+    assert sampleinfo.values("pop") == ["CHS", "PUR", "YRI"]
+
+
+def test_where():
+    rows = sampleinfo.where(pop="PUR", is_pool=False)
+    assert len(rows) == 12
+    assert all(x.pop == "PUR" and not x.is_pool for x in rows)
+    rows = sampleinfo.where(run=["CHS.HG00512", "YRI"], read="1")
+    assert [x.fastq for x in rows] == ["CHS.HG00512_1.fastq.gz", "YRI_1.fastq.gz"]
+    assert len(sampleinfo.where(pop="foo")) == 0
+    with pytest.raises(ValueError):
+        sampleinfo.where(foo="bar")
+
+
+def test_append_index():
+    table = SampleTable(sampleinfo.where(pop="CHS"))
+    assert len(table.where(sample="CHS")) == 2
+    table.append(["CHS", "030303_AAABBB33XX", "CHS", "p3", "CHS_3.fastq.gz", "1", "CHS.3", "true"])
+    assert len(table.where(sample="CHS")) == 3
+    assert table[-1].is_pool is True
+
+
+@pytest.mark.parametrize("suffix", [".tsv", ".csv"])
+def test_from_file(tmpdir, suffix):
+    sheet = tmpdir.join("samplesheet" + suffix)
+    sampleinfo.to_file(sheet)
+    table = SampleTable.from_file(sheet)
+    assert list(table) == list(sampleinfo)
+    sheet.write("sample\tfastq\nS1\tS1_1.fastq.gz\n")
+    table = SampleTable.from_file(sheet, sep="\t")
+    assert table[0] == Sample("S1", "", "", "", "S1_1.fastq.gz", "", "S1", False)
+    sheet.write("sample\tread\nS1\t1\n")
+    with pytest.raises(ValueError):
+        SampleTable.from_file(sheet, sep="\t")
+
+
+def test_fanout():
+    table = fanout(sampleinfo, 1000, batch_size=96)
+    assert len(table) == 2000
+    assert table[0].sample == "CHS.SYN000" and table[-1].sample == "YRI.SYN999"
+    assert len(table.values("batch")) == 11
+    assert len(table.values("sample")) == 1000
+    assert set(x.fastq for x in table) == set(x.fastq for x in sampleinfo.where(is_pool=False))
+    # Callers get their own table
+    table.append(table[0])
+    again = fanout(sampleinfo, 1000, batch_size=96)
+    assert again is not table
+    assert len(again) == 2000
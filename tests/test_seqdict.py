@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+test_seqdict
+----------------------------------
+
+Tests for `pytest_ngsfixtures.seqdict` module.
+"""
+import pytest
+from pytest_ngsfixtures.config import REF_DIR
+from pytest_ngsfixtures.os import localpath
+from pytest_ngsfixtures import seqdict
+from pytest_ngsfixtures.seqdict import sequence_dictionary, write_sidecars, sidecar_stem
+
+
+def _strip_uri(text):
+    return [x.split("\tUR:")[0] for x in text.splitlines()]
+
+
+@pytest.fixture
+def scaffolds(tmpdir):
+    p = tmpdir.join("scaffolds.fa")
+    p.write_binary(localpath("ref/scaffolds.fa").read_binary())
+    return p
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_sequence_dictionary(scaffolds, processes, monkeypatch):
+    monkeypatch.setattr(seqdict, "PARALLEL_MIN_LENGTH", 0)
+    sd = sequence_dictionary(str(scaffolds), processes=processes)
+    assert sd[0] == ("scaffold1", 1050000, "132d6a865577c9f94c302555801ce407")
+    assert len(sd) == 13
+
+
+def test_write_sidecars(scaffolds):
+    outputs = write_sidecars(str(scaffolds))
+    assert [x[len(str(scaffolds)) - 3:] for x in outputs] == [".dict", ".interval_list", ".chrom.sizes"]
+    for suffix in seqdict.SIDECARS:
+        expected = (REF_DIR / ("scaffolds" + suffix)).read_text()
+        assert _strip_uri(scaffolds.dirpath().join("scaffolds" + suffix).read()) == _strip_uri(expected)
+    assert write_sidecars(str(scaffolds)) == []
+
+
+def test_sequence_dictionary_case(tmpdir):
+    p = tmpdir.join("test.fasta")
+    p.write(">a\nacgt\nAC\n>b\nACGTAC\n")
+    sd = sequence_dictionary(str(p))
+    assert sd[0][2] == sd[1][2]
+    assert sidecar_stem(str(p)) == str(tmpdir.join("test"))
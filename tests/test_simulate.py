@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+test_simulate
+----------------------------------
+
+Tests for `pytest_ngsfixtures.simulate` module.
+"""
+import gzip
+import pytest
+from pytest_ngsfixtures.os import localpath
+
+np = pytest.importorskip("numpy")
+
+from pytest_ngsfixtures.simulate import simulate, simulate_cached, read_fasta  # noqa: E402
+
+
+def _read_fastq(path):
+    with gzip.open(path, "rt") as fh:
+        lines = fh.read().splitlines()
+    return lines[0::4], lines[1::4], lines[3::4]
+
+
+def _revcomp(seq):
+    return seq[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+
+def test_read_fasta():
+    seq, offsets = read_fasta(str(localpath("ref/scaffolds.fa")))
+    assert offsets[-1] == len(seq)
+    assert offsets[1] == 1050000
+
+
+def test_simulate(tmpdir):
+    r1, r2 = simulate(str(tmpdir), reads=500, read_length=50, substitution_rate=0, indel_rate=0, seed=3)
+    names1, seqs1, quals1 = _read_fastq(r1)
+    names2, seqs2, quals2 = _read_fastq(r2)
+    assert len(seqs1) == len(seqs2) == 500
+    assert names1[0] == "@sim.000/1" and names2[0] == "@sim.000/2"
+    assert all(len(x) == 50 for x in seqs1 + quals2)
+    ref = "".join(x for x in open(str(localpath("ref/scaffolds.fa"))).read().split("\n") if not x.startswith(">"))
+    assert all(x in ref for x in seqs1[:20])
+    assert all(_revcomp(x) in ref for x in seqs2[:20])
+
+
+def test_simulate_errors(tmpdir):
+    r1, _ = simulate(str(tmpdir.mkdir("a")), reads=200, seed=1, substitution_rate=0.05, indel_rate=0.01)
+    r1b, _ = simulate(str(tmpdir.mkdir("b")), reads=200, seed=1, substitution_rate=0.05, indel_rate=0.01)
+    assert gzip.open(r1).read() == gzip.open(r1b).read()
+    names, seqs, quals = _read_fastq(r1)
+    ref = "".join(x for x in open(str(localpath("ref/scaffolds.fa"))).read().split("\n") if not x.startswith(">"))
+    assert sum(x in ref for x in seqs) < len(seqs) / 2
+
+
+def test_simulate_cached(tmpdir):
+    files = simulate_cached(str(tmpdir), reads=100)
+    mtime = tmpdir.join(files[0].split("/")[-2]).mtime()
+    assert simulate_cached(str(tmpdir), reads=100) == files
+    assert tmpdir.join(files[0].split("/")[-2]).mtime() == mtime
+    assert simulate_cached(str(tmpdir), reads=100, seed=2) != files
+
+
+@pytest.mark.samples(dirname="simulate", simulate={'reads': 100, 'sample': 'foo'})
+def test_simulate_samples(samples, simulate_fastq):
+    assert sorted(x.basename for x in samples.listdir()) == ["foo_1.fastq.gz", "foo_2.fastq.gz"]
+    r1, r2 = simulate_fastq(reads=100, sample='foo')
+    assert samples.join("foo_1.fastq.gz").read_binary() == open(r1, "rb").read()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+test_store
+----------------------------------
+
+Tests for `pytest_ngsfixtures.store` module.
+"""
+import os
+import py
+import pytest
+import threading
+from pytest_ngsfixtures import store as store_module
+from pytest_ngsfixtures.os import CopyEngine
+from pytest_ngsfixtures.store import FixtureStore, digest, unshare, get_store, STORE_DIRNAME
+
+
+def test_store_add(tmpdir_factory, readfile):
+    store = FixtureStore(tmpdir_factory.mktemp("store"))
+    entry = store.add(readfile)
+    assert entry.basename == digest(readfile)
+    assert not os.access(str(entry), os.W_OK) or os.getuid() == 0
+    assert store.add(str(readfile)) == entry
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_store_clone(tmpdir_factory, readfile):
+    store = FixtureStore(tmpdir_factory.mktemp("store"))
+    p = tmpdir_factory.mktemp("clone")
+    strategy = store.clone(readfile, p.join("foo.fastq.gz"))
+    store.clone(readfile, p.join("bar.fastq.gz"))
+    assert strategy != "hardlink"
+    assert p.join("foo.fastq.gz").computehash() == readfile.computehash()
+    assert not p.join("foo.fastq.gz").samefile(p.join("bar.fastq.gz"))
+    # Writing to, or changing permissions of, a clone leaves the store intact
+    os.chmod(str(p.join("foo.fastq.gz")), 0o600)
+    p.join("foo.fastq.gz").write("foo")
+    assert store.add(readfile).computehash() == readfile.computehash()
+    assert p.join("bar.fastq.gz").computehash() == readfile.computehash()
+
+
+def test_store_clone_no_reflink(tmpdir_factory, readfile, monkeypatch):
+    monkeypatch.setattr(store_module, "copy_engine", CopyEngine(strategies=["sendfile", "userspace"]))
+    store = FixtureStore(tmpdir_factory.mktemp("store"))
+    p = tmpdir_factory.mktemp("clone")
+    assert store.clone(readfile, p.join("foo.fastq.gz")) in ("sendfile", "userspace")
+    assert (store.hits, store.misses) == (0, 1)
+    # Once reflinks are known to be unsupported, the store is skipped
+    assert store.clone(readfile, p.join("bar.fastq.gz")) in ("sendfile", "userspace")
+    assert (store.hits, store.misses) == (0, 1)
+    assert p.join("bar.fastq.gz").computehash() == readfile.computehash()
+
+
+def test_store_link(tmpdir_factory, readfile):
+    store = FixtureStore(tmpdir_factory.mktemp("store"))
+    p = tmpdir_factory.mktemp("link")
+    assert store.link(readfile, p.join("foo.fastq.gz")) == "hardlink"
+    assert store.link(readfile, p.join("bar.fastq.gz")) == "hardlink"
+    assert p.join("foo.fastq.gz").samefile(store.add(readfile))
+    assert p.join("foo.fastq.gz").samefile(p.join("bar.fastq.gz"))
+    assert not p.join("foo.fastq.gz").samefile(readfile)
+    with pytest.raises(py.error.EEXIST):
+        store.link(readfile, p.join("foo.fastq.gz"))
+
+
+def test_store_add_concurrent(tmpdir_factory, readfile):
+    path = tmpdir_factory.mktemp("store")
+    stores = [FixtureStore(path) for i in range(4)]
+    threads = [threading.Thread(target=x.add, args=(readfile,)) for x in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(x.misses for x in stores) == 1
+    assert sum(x.hits for x in stores) == 3
+
+
+def test_get_store_xdist(tmpdir_factory, monkeypatch):
+    class Factory:
+        def getbasetemp(self):
+            return tmpdir_factory.getbasetemp().join("popen-gw1")
+
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw1")
+    store = get_store(Factory())
+    assert store.path == tmpdir_factory.getbasetemp().join(STORE_DIRNAME)
+
+
+def test_get_store_xdist_workers(testdir):
+    pytest.importorskip("xdist")
+    stores = testdir.tmpdir.join("stores.txt")
+    testdir.makepyfile("""
+        import pytest
+        from pytest_ngsfixtures.store import get_store
+
+        @pytest.mark.parametrize("i", range(4))
+        def test_store(tmpdir_factory, i):
+            with open({!r}, "a") as fh:
+                fh.write(str(get_store(tmpdir_factory).path) + "\\n")
+    """.format(str(stores)))
+    result = testdir.runpytest("-n", "2")
+    result.assert_outcomes(passed=4)
+    assert set(stores.read().splitlines()) == {str(testdir.tmpdir.join("basetemp", STORE_DIRNAME))}
+
+
+def test_unshare(tmpdir):
+    src = tmpdir.join("src.txt")
+    src.write("foo")
+    os.chmod(str(src), 0o444)
+    dst = tmpdir.join("dst.txt")
+    os.link(str(src), str(dst))
+    unshare(dst)
+    assert not dst.samefile(src)
+    dst.write("bar")
+    assert src.read() == "foo"
+
+
+@pytest.mark.samples(mode="store", dirname="store")
+def test_store_fixture(samples):
+    assert samples.join("s1_1.fastq.gz").exists()
+    assert "symlink" not in samples.strategies
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+test_subsample
+----------------------------------
+
+Tests for `pytest_ngsfixtures.subsample` module.
+"""
+import re
+import gzip
+import pytest
+from pytest_ngsfixtures.config import SAMPLES_DIR
+from pytest_ngsfixtures.subsample import subsample, subsample_cached, reservoir, bernoulli
+
+R1 = str(SAMPLES_DIR / "PUR.HG00731_1.fastq.gz")
+R2 = str(SAMPLES_DIR / "PUR.HG00731_2.fastq.gz")
+
+
+def _names(path):
+    with gzip.open(str(path), "rt") as fh:
+        return [re.sub("/[12]$", "", x.split()[0]) for x in fh.read().splitlines()[0::4]]
+
+
+def test_reservoir():
+    assert reservoir(range(10), 20) == list(range(10))
+    sample = reservoir(range(100000), 100, seed=3)
+    assert len(sample) == 100 and sample == sorted(sample)
+    assert sample == reservoir(range(100000), 100, seed=3)
+    assert sample != reservoir(range(100000), 100, seed=4)
+
+
+def test_bernoulli():
+    sample = list(bernoulli(range(100000), 0.1, seed=3))
+    assert 9000 < len(sample) < 11000
+    assert list(bernoulli(range(10), 1)) == list(range(10))
+    assert list(bernoulli(range(10), 0)) == []
+
+
+@pytest.mark.parametrize("kwargs", [{'n_reads': 50}, {'fraction': 0.2}])
+def test_subsample_pairs(tmpdir, kwargs):
+    out = [str(tmpdir.join("o_1.fastq.gz")), str(tmpdir.join("o_2.fastq.gz"))]
+    n = subsample([R1, R2], out, **kwargs)
+    names = _names(out[0])
+    assert len(names) == n
+    assert names == _names(out[1])
+    assert set(names) <= set(_names(R1))
+    if 'n_reads' in kwargs:
+        assert n == 50
+
+
+def test_subsample_unpaired(tmpdir):
+    bad = tmpdir.join("bad.fastq")
+    bad.write("@r1\nACGT\n+\nIIII\n")
+    with pytest.raises(ValueError, match="different numbers of records"):
+        subsample([R1, str(bad)], [str(tmpdir.join("a.fq")), str(tmpdir.join("b.fq"))], n_reads=1)
+
+
+def test_subsample_cached(tmpdir):
+    files = subsample_cached(str(tmpdir), [R1, R2], n_reads=10)
+    assert subsample_cached(str(tmpdir), [R1, R2], n_reads=10) == files
+    assert subsample_cached(str(tmpdir), [R1, R2], n_reads=10, seed=2) != files
+
+
+@pytest.mark.samples(dirname="downsample", n_reads=25, seed=2, layout_template="{SM}_{read}.fastq.gz",
+                     selection={'pop': 'PUR', 'is_pool': False})
+def test_samples_n_reads(samples):
+    files = sorted(x.basename for x in samples.listdir())
+    assert len(files) == 4
+    for r1, r2 in zip(files[0::2], files[1::2]):
+        assert len(_names(samples.join(r1))) == 25
+        assert _names(samples.join(r1)) == _names(samples.join(r2))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+test_template
+----------------------------------
+
+Tests for `pytest_ngsfixtures.template` module.
+"""
+import os
+import pytest
+from pytest_ngsfixtures.template import compile_template, layout_from_template
+from pytest_ngsfixtures.sampletable import SampleTable
+from pytest_ngsfixtures.config import sampleinfo, SAMPLES_DIR, layout
+
+
+def test_compile_template():
+    t = compile_template("{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz")
+    assert t is compile_template("{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz")
+    assert t.fields == ("pop", "sample", "pu", "read")
+    assert t.render(sampleinfo[0]) == "CHS/CHS.HG00512/CHS.HG00512_010101_AAABBB11XX_1.fastq.gz"
+    assert compile_template("{{x}}/{SM[0]}/{read:>02}.fq").render(sampleinfo[0]) == "{x}/C/01.fq"
+    assert compile_template("{sample}").render(sampleinfo[0]) == "CHS.HG00512"
+    with pytest.raises(ValueError):
+        compile_template("{foo}/{SM}")
+
+
+def test_layout_from_template():
+    data = layout_from_template("{SM}/{SM}_{read}.fastq.gz", pop="PUR", is_pool=False)
+    assert len(data) == 4
+    assert data["PUR.HG00731/PUR.HG00731_1.fastq.gz"] == os.path.join(str(SAMPLES_DIR), "PUR.HG00731_1.fastq.gz")
+    data["foo"] = "bar"
+    again = layout_from_template("{SM}/{SM}_{read}.fastq.gz", is_pool=False, pop="PUR")
+    assert again is not data
+    assert len(again) == 4 and "foo" not in again
+    assert layout['pop_sample'] == layout_from_template("{POP}/{SM}/{SM}_{PU}_{read}.fastq.gz", run=["CHS", "PUR", "YRI"])
+
+
+def test_layout_from_template_table():
+    table = SampleTable(sampleinfo.where(sample="CHS"))
+    data = layout_from_template("{FASTQ}", table=table, srcdir="/foo")
+    assert data == {"CHS_1.fastq.gz": "/foo/CHS_1.fastq.gz", "CHS_2.fastq.gz": "/foo/CHS_2.fastq.gz"}
+    table.append(["CHS", "", "CHS", "", "CHS_3.fastq.gz", "3", "CHS", True])
+    assert len(layout_from_template("{FASTQ}", table=table, srcdir="/foo")) == 3
+    copy = SampleTable(table)
+    assert layout_from_template("{FASTQ}", table=copy, srcdir="/foo") == layout_from_template("{FASTQ}", table=table, srcdir="/foo")
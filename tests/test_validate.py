@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+test_validate
+----------------------------------
+
+Tests for `pytest_ngsfixtures.validate` module.
+"""
+import gzip
+import pytest
+from pytest_ngsfixtures.config import SAMPLES_DIR
+from pytest_ngsfixtures.validate import validate_fastq, validate_pair, assert_fastq, FastqError
+
+R1 = str(SAMPLES_DIR / "PUR.HG00731_1.fastq.gz")
+R2 = str(SAMPLES_DIR / "PUR.HG00731_2.fastq.gz")
+
+
+def _records(path):
+    with gzip.open(path, "rb") as fh:
+        return fh.read().splitlines(keepends=True)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000, 4 * 1024 * 1024])
+def test_validate_fastq(chunk_size):
+    lines = _records(R1)
+    stats = validate_fastq(R1, chunk_size=chunk_size)
+    assert stats.records == len(lines) // 4
+    assert stats.unique == len(set(x.split()[0] for x in lines[0::4]))
+    assert stats.bases == sum(len(x.strip()) for x in lines[1::4])
+
+
+def test_validate_pair():
+    s1, s2 = validate_pair(R1, R2)
+    assert s1.digest == s2.digest
+    with pytest.raises(FastqError, match="different"):
+        validate_pair(R1, str(SAMPLES_DIR / "PUR.HG00733_2.fastq.gz"))
+
+
+@pytest.mark.parametrize("content, message", [
+    ("@r1\nACGT\n+\nIIII\n@r2\nACGT\n+\nIII\n", "record 2: sequence and quality lengths differ"),
+    ("@r1\nACGT\n+\nIIII\nr2\nACGT\n+\nIIII\n", "record 2: header"),
+    ("@r1\nACGT\n-\nIIII\n", "record 1: separator"),
+    ("@r1\nACGT\n+\nIIII\n@r2\nACGT\n", "truncated record after record 1"),
+])
+def test_validate_fastq_errors(tmpdir, content, message):
+    p = tmpdir.join("bad.fastq")
+    p.write(content)
+    with pytest.raises(FastqError, match=message):
+        validate_fastq(str(p))
+
+
+def test_validate_fastq_no_final_newline(tmpdir):
+    p = tmpdir.join("ok.fastq")
+    p.write("@r1/1\nACGT\n+\nIIII\n@r1/1\nAC\n+\nII")
+    stats = validate_fastq(str(p))
+    assert (stats.records, stats.unique, stats.bases) == (2, 1, 6)
+
+
+def test_assert_fastq(tmpdir):
+    stats = assert_fastq(R1, R2)
+    assert_fastq(R1, n_reads=stats.records)
+    with pytest.raises(AssertionError, match="expected 1 records"):
+        assert_fastq(R1, n_reads=1)
+    p = tmpdir.join("dup.fastq")
+    p.write("@r1\nACGT\n+\nIIII\n@r1\nACGT\n+\nIIII\n")
+    with pytest.raises(AssertionError, match="unique read names"):
+        assert_fastq(str(p))